@@ -1,11 +1,15 @@
-from os.path import dirname, join
+from os.path import dirname, expanduser, join
 
 DATA_ROOT = join(dirname(dirname(__file__)), "data")
 IMG_ROOT = join(DATA_ROOT, "images")
 MAP_ROOT = join(DATA_ROOT, "map")
 SETTING_ROOT = join(DATA_ROOT, "settings")
 OCR_ROOT = join(DATA_ROOT, "ocr")
+PAGE_SIGNATURE_PATH = join(DATA_ROOT, "page_signatures.yaml")
 
 BIN_ROOT = join(dirname(DATA_ROOT), "bin")
 TUNNEL_ROOT = join(BIN_ROOT, "image_recognize")
 ADB_ROOT = join(BIN_ROOT, "adb")
+
+# 运行中生成并保存的数据 (如 OCR 服务的密钥), 安装目录可能不可写
+USER_DATA_ROOT = join(expanduser("~"), ".autowsgr")
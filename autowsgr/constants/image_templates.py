@@ -1,5 +1,19 @@
+import math
+import types
 from functools import partial
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
+import cv2
+import numpy as np
+from airtest import aircv
+from airtest.aircv.cal_confidence import cal_rgb_confidence
+from airtest.aircv.template_matching import TemplateMatching
+from airtest.aircv.utils import (
+    check_source_larger_than_search,
+    generate_result,
+    img_mat_rgb_2_gray,
+)
 from airtest.core.cv import (
     MATCHING_METHODS,
     ST,
@@ -9,11 +23,187 @@ from airtest.core.cv import (
 )
 from airtest.core.settings import Settings as ST
 
-from autowsgr.constants.data_roots import IMG_ROOT
-from autowsgr.utils.io import create_namespace
+from autowsgr.constants.data_roots import IMG_ROOT, USER_DATA_ROOT
+from autowsgr.utils.io import create_namespace, dict_to_yaml, yaml_to_dict
+
+
+class PreparedTemplate(NamedTuple):
+    """按截图分辨率缩放好的模板数据"""
+
+    ori: np.ndarray  # 原始 BGR 图像
+    image: np.ndarray  # 缩放到截图分辨率下的 BGR 图像
+    gray: np.ndarray  # image 的灰度图
+    levels: List[np.ndarray]  # gray 的高斯金字塔, levels[0] 为 gray
+
+
+# (模板路径, 截图分辨率) -> PreparedTemplate
+TEMPLATE_CACHE: Dict[Tuple[str, Tuple[int, int]], PreparedTemplate] = {}
+
+# 没有随包发布搜索区域的模板匹配成功时记录的位置: 模板路径 -> [x1, y1, x2, y2] (960x540)
+# 只在 set_roi_recording(True) 后记录
+TEMPLATE_HITS: Dict[str, List[int]] = {}
+RECORD_HITS = False
+
+# 运行中学到的搜索区域, 格式为 {模板相对 IMG_ROOT 的路径(不含后缀): [x1, y1, x2, y2]},
+# 覆盖在图片目录下随包发布的 roi.yaml 之上
+LEARNED_ROI_PATH = Path(USER_DATA_ROOT) / "template_roi.yaml"
+
+ROI_MARGIN = 10  # 搜索区域向外扩展的像素数 (960x540)
+
+# 金字塔匹配 ("pyrtpl") 参数
+PYRAMID_MAX_LEVEL = 2  # 最多缩小到 1/4
+PYRAMID_MIN_SIZE = 12  # 缩小后模板的最短边不小于该值
+PYRAMID_CANDIDATES = 3  # 在粗匹配中取前几个候选位置进行细化
+
+# match_screen 支持的匹配方式
+SCREEN_METHODS = ("tpl", "pyrtpl")
+
+
+def build_pyramid(gray, max_level=PYRAMID_MAX_LEVEL):
+    """构建高斯金字塔, 第 0 层为原图"""
+    levels = [gray]
+    for _ in range(max_level):
+        levels.append(cv2.pyrDown(levels[-1]))
+    return levels
+
+
+def pyramid_level(template_shape):
+    """根据模板大小选择粗匹配的金字塔层数, 模板太小时为 0 (即不使用金字塔)"""
+    size = min(template_shape[:2])
+    level = 0
+    while level < PYRAMID_MAX_LEVEL and size >> (level + 1) >= PYRAMID_MIN_SIZE:
+        level += 1
+    return level
+
+
+def pyramid_match(gray, coarse, template, template_coarse, level, box):
+    """由粗到细的模板匹配
+
+    先在第 level 层金字塔上匹配, 再在全分辨率下只对得分最高的几个候选位置附近进行细化,
+    返回的置信度与直接在全分辨率下使用 TM_CCOEFF_NORMED 的结果一致
+
+    Args:
+        gray (np.ndarray): 全分辨率灰度截图
+        coarse (np.ndarray): 截图的第 level 层金字塔
+        template (np.ndarray): 全分辨率灰度模板
+        template_coarse (np.ndarray): 模板的第 level 层金字塔
+        level (int): 金字塔层数
+        box (tuple): 在 gray 中的搜索区域 (x1, y1, x2, y2)
+
+    Returns:
+        (confidence, (left, top)): 最佳位置的置信度和左上角坐标, 无法匹配时返回 None
+    """
+    x1, y1, x2, y2 = box
+    cx1, cy1, cx2, cy2 = x1 >> level, y1 >> level, x2 >> level, y2 >> level
+    source = coarse[cy1:cy2, cx1:cx2]
+    th, tw = template_coarse.shape[:2]
+    if source.shape[0] < th or source.shape[1] < tw:
+        return None
+    res = cv2.matchTemplate(source, template_coarse, cv2.TM_CCOEFF_NORMED)
+
+    h, w = template.shape[:2]
+    scale = 1 << level
+    margin = 2 * scale
+    best = None
+    for _ in range(PYRAMID_CANDIDATES):
+        _, value, _, (cx, cy) = cv2.minMaxLoc(res)
+        if value < -1:
+            break  # 所有候选位置都已被屏蔽
+        x, y = (cx + cx1) * scale, (cy + cy1) * scale
+        wx1, wy1 = max(x - margin, x1), max(y - margin, y1)
+        wx2, wy2 = min(x + w + margin, x2), min(y + h + margin, y2)
+        window = gray[wy1:wy2, wx1:wx2]
+        if window.shape[0] >= h and window.shape[1] >= w:
+            refined = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, confidence, _, (left, top) = cv2.minMaxLoc(refined)
+            if best is None or confidence > best[0]:
+                best = (confidence, (left + wx1, top + wy1))
+        # 屏蔽该候选位置附近, 继续取下一个候选
+        cv2.rectangle(
+            res, (cx - tw // 2, cy - th // 2), (cx + tw // 2, cy + th // 2), -2, -1
+        )
+    return best
+
+
+class PyramidTemplateMatching(TemplateMatching):
+    """由粗到细的金字塔模板匹配, 注册为 airtest 的 "pyrtpl" 匹配方式
+
+    置信度与 "tpl" 一致, 但只在全分辨率下对少数候选位置进行细化
+    """
+
+    METHOD_NAME = "PyramidTemplate"
+
+    def find_best_result(self):
+        check_source_larger_than_search(self.im_source, self.im_search)
+        gray = img_mat_rgb_2_gray(self.im_source)
+        template = img_mat_rgb_2_gray(self.im_search)
+        level = pyramid_level(template.shape)
+        ret = pyramid_match(
+            gray,
+            build_pyramid(gray, level)[level],
+            template,
+            build_pyramid(template, level)[level],
+            level,
+            (0, 0, gray.shape[1], gray.shape[0]),
+        )
+        if ret is None:
+            return None
+        confidence, max_loc = ret
+        h, w = self.im_search.shape[:2]
+        if self.rgb:
+            confidence = self._get_confidence_from_matrix(max_loc, confidence, w, h)
+        middle_point, rectangle = self._get_target_rectangle(max_loc, w, h)
+        best_match = generate_result(middle_point, rectangle, confidence)
+        return best_match if confidence >= self.threshold else None
+
+
+MATCHING_METHODS["pyrtpl"] = PyramidTemplateMatching
+
+
+class PreparedScreen:
+    """一帧截图在匹配中反复用到的数据 (灰度图, 金字塔), 每种只计算一次
+
+    同一帧截图上匹配多张模板时应共用同一个 PreparedScreen
+    """
+
+    def __init__(self, image: np.ndarray) -> None:
+        self.image = image  # BGR 截图
+        self.resolution = (image.shape[1], image.shape[0])
+        self._gray = None
+        self._pyramid = {}
+
+    @property
+    def gray(self) -> np.ndarray:
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    def pyramid(self, level) -> np.ndarray:
+        """灰度图的第 level 层高斯金字塔, 第 0 层为灰度图本身"""
+        if level == 0:
+            return self.gray
+        if level not in self._pyramid:
+            self._pyramid[level] = cv2.pyrDown(self.pyramid(level - 1))
+        return self._pyramid[level]
 
 
 class MyTemplate(Template):
+    def __init__(self, filename, roi=None, match_method=None, **kwargs):
+        """
+        Args:
+            roi (list, optional): 搜索区域 [x1, y1, x2, y2], 坐标相对 960x540 屏幕,
+                为 None 时全屏搜索. 一般由图片目录下的 roi.yaml 或学到的搜索区域提供
+
+            match_method (str, optional): 该模板固定使用的匹配方式 ("tpl" 或 "pyrtpl"),
+                为 None 时使用调用方指定的方式
+        """
+        super().__init__(filename, **kwargs)
+        self.roi = roi
+        self.roi_learned = (
+            False  # roi 是否来自学到的搜索区域, 是则继续记录匹配位置以扩大区域
+        )
+        self.match_method = match_method
+
     def __radd__(self, other):
         if isinstance(other, list):
             return other + [self]  # 添加到列表开头
@@ -33,9 +223,149 @@ class MyTemplate(Template):
         focus_pos = TargetPos().getXY(match_result, self.target_pos)
         return focus_pos
 
+    def prepare(self, screen_resolution) -> PreparedTemplate:
+        """读取并缓存模板在给定截图分辨率下的数据, 每个 (路径, 分辨率) 只计算一次
+
+        Args:
+            screen_resolution (Tuple[int, int]): 截图分辨率 (宽, 高)
+        """
+        screen_resolution = tuple(screen_resolution)
+        key = (self.filepath, screen_resolution)
+        prepared = TEMPLATE_CACHE.get(key)
+        if prepared is None:
+            ori = self._imread()
+            image = self._resize_to(ori, screen_resolution)
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            prepared = PreparedTemplate(ori, image, gray, build_pyramid(gray))
+            TEMPLATE_CACHE[key] = prepared
+        return prepared
+
+    def _resize_to(self, image, screen_resolution):
+        """与 Template._resize_image 相同, 但只需要截图分辨率"""
+        resize_method = ST.RESIZE_METHOD
+        if not self.resolution or resize_method is None:
+            return image
+        if tuple(self.resolution) == tuple(screen_resolution):
+            return image
+        if isinstance(resize_method, types.MethodType):
+            resize_method = resize_method.__func__
+        h, w = image.shape[:2]
+        w_re, h_re = resize_method(w, h, self.resolution, screen_resolution)
+        w_re, h_re = max(1, w_re), max(1, h_re)
+        return cv2.resize(image, (w_re, h_re))
+
+    def _search_box(self, screen_resolution, prepared: PreparedTemplate):
+        """根据 roi 计算截图中的搜索区域 (x1, y1, x2, y2)
+
+        没有 roi 或 roi 放不下模板时返回全屏
+        """
+        w, h = screen_resolution
+        if self.roi is None:
+            return 0, 0, w, h
+        sx, sy = w / 960, h / 540
+        x1, y1, x2, y2 = self.roi
+        x1 = max(int((x1 - ROI_MARGIN) * sx), 0)
+        y1 = max(int((y1 - ROI_MARGIN) * sy), 0)
+        x2 = min(math.ceil((x2 + ROI_MARGIN) * sx), w)
+        y2 = min(math.ceil((y2 + ROI_MARGIN) * sy), h)
+        th, tw = prepared.image.shape[:2]
+        if x2 - x1 < tw or y2 - y1 < th:
+            return 0, 0, w, h
+        return x1, y1, x2, y2
+
+    def search_box(self, screen_resolution):
+        """返回模板在给定截图分辨率下的搜索区域 (x1, y1, x2, y2), 全屏搜索时为整个截图"""
+        return self._search_box(screen_resolution, self.prepare(screen_resolution))
+
+    def match_screen(
+        self, screen: PreparedScreen, threshold=None, method="tpl"
+    ) -> Optional[dict]:
+        """在预处理过的截图上进行模板匹配
+
+        先在搜索区域内匹配, 低于阈值时再全屏匹配一次, 避免界面位置变化后一直匹配失败
+
+        Args:
+            screen (PreparedScreen): 截图
+            threshold (float, optional): 阈值, 用于决定是否全屏重试和记录匹配位置. Defaults to self.threshold.
+            method (str, optional): "tpl" 或 "pyrtpl", 模板指定了 match_method 时以模板为准. Defaults to "tpl".
+        Returns:
+            dict: 最佳匹配结果 (不论是否超过阈值), 格式同 airtest; 模板比截图大时为 None
+        """
+        if threshold is None:
+            threshold = self.threshold
+        method = self.match_method or method
+        prepared = self.prepare(screen.resolution)
+        box = self._search_box(screen.resolution, prepared)
+        full = (0, 0) + tuple(screen.resolution)
+        ret = self._match_box(screen, prepared, box, method)
+        if box != full and (ret is None or ret["confidence"] < threshold):
+            ret = self._match_box(screen, prepared, full, method)
+        if ret is not None and ret["confidence"] >= threshold:
+            self._record_hit(ret, screen.resolution)
+        return ret
+
+    def _match_box(self, screen: PreparedScreen, prepared, box, method):
+        """在截图的 box 区域内匹配, 模板比区域大时返回 None"""
+        x1, y1, x2, y2 = box
+        h, w = prepared.gray.shape[:2]
+        if y2 - y1 < h or x2 - x1 < w:
+            return None
+        level = pyramid_level(prepared.gray.shape) if method == "pyrtpl" else 0
+        if level > 0:
+            ret = pyramid_match(
+                screen.gray,
+                screen.pyramid(level),
+                prepared.gray,
+                prepared.levels[level],
+                level,
+                box,
+            )
+            if ret is None:
+                return None
+            confidence, (left, top) = ret
+        else:
+            source = screen.gray[y1:y2, x1:x2]
+            res = cv2.matchTemplate(source, prepared.gray, cv2.TM_CCOEFF_NORMED)
+            _, confidence, _, (left, top) = cv2.minMaxLoc(res)
+            left, top = left + x1, top + y1
+        if self.rgb:
+            crop = screen.image[top : top + h, left : left + w]
+            confidence = cal_rgb_confidence(crop, prepared.image)
+        middle_point = (int(left + w / 2), int(top + h / 2))
+        rectangle = (
+            (left, top),
+            (left, top + h),
+            (left + w, top + h),
+            (left + w, top),
+        )
+        return generate_result(middle_point, rectangle, confidence)
+
+    def _record_hit(self, ret, screen_resolution):
+        """记录匹配成功的位置, 用于生成学到的搜索区域, 随包发布了 roi 的模板不记录"""
+        if not RECORD_HITS or (self.roi is not None and not self.roi_learned):
+            return
+        w, h = screen_resolution
+        (x1, y1), _, (x2, y2), _ = ret["rectangle"]
+        box = [
+            int(x1 * 960 / w),
+            int(y1 * 540 / h),
+            math.ceil(x2 * 960 / w),
+            math.ceil(y2 * 540 / h),
+        ]
+        hit = TEMPLATE_HITS.get(self.filepath)
+        if hit is not None:
+            box = [
+                min(hit[0], box[0]),
+                min(hit[1], box[1]),
+                max(hit[2], box[2]),
+                max(hit[3], box[3]),
+            ]
+        TEMPLATE_HITS[self.filepath] = box
+
     def _cv_match(self, screen, this_methods=None):
-        ori_image = self._imread()
-        image = self._resize_image(ori_image, screen, ST.RESIZE_METHOD)
+        screen_resolution = aircv.get_resolution(screen)
+        prepared = self.prepare(screen_resolution)
+        ori_image, image = prepared.ori, prepared.image
         ret = None
         if this_methods is None:
             this_methods = ST.CVSTRATEGY
@@ -58,15 +388,145 @@ class MyTemplate(Template):
                     scale_max=self.scale_max,
                     scale_step=self.scale_step,
                 )
+            elif method in SCREEN_METHODS:
+                ret = self.match_screen(PreparedScreen(screen), method=method)
+                if ret is not None and ret["confidence"] < self.threshold:
+                    ret = None
             else:
+                x1, y1, x2, y2 = self._search_box(screen_resolution, prepared)
                 ret = self._try_match(
-                    func, image, screen, threshold=self.threshold, rgb=self.rgb
+                    func,
+                    image,
+                    screen[y1:y2, x1:x2],
+                    threshold=self.threshold,
+                    rgb=self.rgb,
                 )
+                if ret:
+                    ret = _shift_result(ret, x1, y1)
+                elif (x1, y1, x2, y2) != (0, 0) + tuple(screen_resolution):
+                    # 搜索区域内没有匹配到时全屏重试
+                    ret = self._try_match(
+                        func, image, screen, threshold=self.threshold, rgb=self.rgb
+                    )
+                if ret:
+                    self._record_hit(ret, screen_resolution)
             if ret:
                 break
         return ret
 
 
+def _shift_result(ret, dx, dy):
+    """把在搜索区域中的匹配结果平移回全屏坐标"""
+    if dx == 0 and dy == 0:
+        return ret
+    x, y = ret["result"]
+    ret["result"] = (x + dx, y + dy)
+    ret["rectangle"] = tuple((px + dx, py + dy) for px, py in ret["rectangle"])
+    return ret
+
+
+def iter_templates(namespace):
+    """遍历 create_namespace 创建的命名空间中的所有模板"""
+    if isinstance(namespace, MyTemplate):
+        yield namespace
+    elif isinstance(namespace, (list, tuple)):
+        for item in namespace:
+            yield from iter_templates(item)
+    elif isinstance(namespace, types.SimpleNamespace):
+        for item in namespace.__dict__.values():
+            yield from iter_templates(item)
+
+
+def preload_templates(namespace, screen_resolution):
+    """在截图分辨率确定后预先计算所有模板, 使匹配时不再读取和缩放模板
+
+    Returns:
+        int: 预加载的模板数量
+    """
+    count = 0
+    for template in iter_templates(namespace):
+        template.prepare(screen_resolution)
+        count += 1
+    return count
+
+
+def template_key(template: MyTemplate):
+    """模板在学到的搜索区域文件中的键: 相对 IMG_ROOT 的路径 (不含后缀)"""
+    path = Path(template.filepath)
+    try:
+        return path.relative_to(IMG_ROOT).with_suffix("").as_posix()
+    except ValueError:
+        return None
+
+
+def set_roi_recording(enabled=True):
+    """开始或停止记录全屏匹配成功的位置, 参考 dump_template_roi"""
+    global RECORD_HITS
+    RECORD_HITS = enabled
+
+
+def load_learned_roi(namespace, path=LEARNED_ROI_PATH):
+    """把学到的搜索区域应用到模板上, 覆盖随包发布的 roi.yaml
+
+    Returns:
+        int: 应用的模板数量
+    """
+    path = Path(path)
+    learned = (yaml_to_dict(path) or {}) if path.exists() else {}
+    count = 0
+    for template in iter_templates(namespace):
+        roi = learned.get(template_key(template))
+        if roi is not None:
+            template.roi, template.roi_learned = roi, True
+            count += 1
+    return count
+
+
+def dump_template_roi(namespace, margin=0, path=LEARNED_ROI_PATH):
+    """把运行中记录的模板位置合并写入学到的搜索区域文件
+
+    写入用户目录而不是安装目录 (可能不可写), 与文件中已有的区域取并集,
+    因此在多个位置出现的模板不会被限制在某一次运行中见到的位置
+
+    Args:
+        margin (int, optional): 在记录的位置外额外扩展的像素数 (960x540). Defaults to 0.
+        path (str, optional): 文件路径. Defaults to LEARNED_ROI_PATH.
+    Returns:
+        int: 新写入或扩大的模板数量
+    """
+    path = Path(path)
+    learned = (yaml_to_dict(path) or {}) if path.exists() else {}
+    count = 0
+    for template in iter_templates(namespace):
+        box = TEMPLATE_HITS.get(template.filepath)
+        key = template_key(template)
+        if box is None or key is None:
+            continue
+        x1, y1, x2, y2 = box
+        box = [
+            max(x1 - margin, 0),
+            max(y1 - margin, 0),
+            min(x2 + margin, 960),
+            min(y2 + margin, 540),
+        ]
+        old = learned.get(key)
+        if old is not None:
+            box = [
+                min(old[0], box[0]),
+                min(old[1], box[1]),
+                max(old[2], box[2]),
+                max(old[3], box[3]),
+            ]
+        if box != old:
+            learned[key] = box
+            count += 1
+    if count:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        dict_to_yaml(learned, path)
+    return count
+
+
 IMG = create_namespace(
     IMG_ROOT, partial(MyTemplate, threshold=0.9, resolution=(960, 540))
 )
+load_learned_roi(IMG)
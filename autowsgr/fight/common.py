@@ -1,4 +1,3 @@
-import copy
 import time
 from abc import ABC, abstractmethod
 
@@ -8,6 +7,7 @@ from autowsgr.constants.image_templates import IMG
 from autowsgr.constants.other_constants import ALL_SHIP_TYPES, SAP
 from autowsgr.constants.positions import BLOOD_BAR_POSITION
 from autowsgr.constants.ui import Node
+from autowsgr.fight.state_watcher import STATE_CADENCE, StateWatcher
 from autowsgr.game.expedition import Expedition
 from autowsgr.game.game_operation import (
     DestroyShip,
@@ -19,6 +19,7 @@ from autowsgr.game.game_operation import (
 from autowsgr.game.get_game_info import get_enemy_condition
 from autowsgr.port.ship import Fleet
 from autowsgr.timer import Timer
+from autowsgr.utils.api_image import first_match_index
 from autowsgr.utils.io import recursive_dict_update, yaml_to_dict
 from autowsgr.utils.math_functions import get_nearest
 
@@ -197,6 +198,14 @@ class FightInfo(ABC):
         )  # 战斗流程的有向图建模，在不同动作有不同后继时才记录动作
         self.state2image = {}  # 所需用到的图片模板。格式为 [模板，等待时间]
         self.after_match_delay = {}  # 匹配成功后的延时。格式为 {状态名 : 延时时间(s),}
+        self.state_cadence = dict(
+            STATE_CADENCE
+        )  # 等待状态时的轮询间隔。格式为 {状态名 : (初始间隔(s), 最大间隔(s)),}
+        self.state_watcher = StateWatcher(timer)  # 状态检测, 同时记录状态转移耗时
+        # 匹配到这些状态后, 在做出决策的同时提前匹配后继状态
+        # 等待后继状态时需要 _before_match 的状态 (如 proceed) 不能加入
+        self.prefetch_states = {"formation", "night", "result"}
+        self._prefetch = None  # (发起预取时的状态, StatePrefetch)
         self.last_state = ""
         self.last_action = ""
         self.state = ""
@@ -206,58 +215,83 @@ class FightInfo(ABC):
         self.ammo = 10  # 我方剩余弹药量
         self.fight_history = FightHistory()  # 战斗结果记录
 
-    def update_state(self):
-        self.last_state = self.state
+    def _possible_states(self, state, action=None):
+        """计算 state 的后继状态
 
-        # 计算当前可能的状态
-        possible_states = copy.deepcopy(self.successor_states[self.last_state])
-        if isinstance(possible_states, dict):
-            possible_states = possible_states[self.last_action]
-        modified_timeout = [-1 for _ in possible_states]  # 某些状态需要修改等待时间
-        for i, state in enumerate(possible_states):
-            if isinstance(state, list):
-                state, timeout = state
-                possible_states[i] = state
-                modified_timeout[i] = timeout
-        if self.config.SHOW_MATCH_FIGHT_STAGE:
-            self.logger.debug("waiting:", possible_states, "  ")
-        images = [self.state2image[state][0] for state in possible_states]
-        timeout = [self.state2image[state][1] for state in possible_states]
-        confidence = min(
+        Args:
+            action (str, optional): 执行的动作, 为 None 时返回所有动作的后继状态
+
+        Returns:
+            Tuple[list, list]: (后继状态, 对应的等待时间)
+        """
+        successors = self.successor_states[state]
+        if isinstance(successors, dict):
+            if action is None:
+                successors = [s for states in successors.values() for s in states]
+            else:
+                successors = successors[action]
+        timeouts = {}
+        for successor in successors:
+            # 某些状态需要修改等待时间
+            if isinstance(successor, list):
+                successor, timeout = successor
+            else:
+                timeout = self.state2image[successor][1]
+            timeouts[successor] = max(timeout, timeouts.get(successor, timeout))
+        return list(timeouts), list(timeouts.values())
+
+    def _confidence(self, states):
+        return min(
             [0.8]
             + [
                 self.state2image[state][2]
-                for state in possible_states
+                for state in states
                 if len(self.state2image[state]) >= 3
             ]
         )
-        timeout = [
-            timeout[i] if modified_timeout[i] == -1 else modified_timeout[i]
-            for i in range(len(timeout))
-        ]
+
+    def update_state(self):
+        self.last_state = self.state
+
+        # 计算当前可能的状态
+        possible_states, timeout = self._possible_states(
+            self.last_state, self.last_action
+        )
+        if self.config.SHOW_MATCH_FIGHT_STAGE:
+            self.logger.debug("waiting:", possible_states, "  ")
+        images = [self.state2image[state][0] for state in possible_states]
+        confidence = self._confidence(possible_states)
         timeout = max(timeout)
-        # 等待其中一种出现
-        fun_start_time = time.time()
-        while time.time() - fun_start_time <= timeout:
-            self._before_match()
-
-            # 尝试匹配
-            ret = [
-                self.timer.image_exist(image, False, confidence=confidence)
-                for image in images
-            ]
-            if any(ret):
-                self.state = possible_states[ret.index(True)]
-                # 查询是否有匹配后延时
-                if self.state in self.after_match_delay:
-                    delay = self.after_match_delay[self.state]
-                    time.sleep(delay)
 
-                if self.config.SHOW_MATCH_FIGHT_STAGE:
-                    self.logger.info(f"matched: {self.state}")
-                self._after_match()
+        # 先查看后台预取的结果
+        index = self._collect_prefetch(possible_states, images, confidence)
+        if index is None:
+            # 等待其中一种出现
+            index = self.state_watcher.wait(
+                possible_states,
+                images,
+                confidence,
+                timeout,
+                cadence=self.state_cadence,
+                before_match=self._before_match,
+            )
+        if index is not None:
+            self.state = possible_states[index]
+            wait = self.state_watcher.last_wait
+            self.state_watcher.stats.add(self.last_state, self.state, **wait)
+            # 查询是否有匹配后延时
+            if self.state in self.after_match_delay:
+                delay = self.after_match_delay[self.state]
+                self.timer.settle(delay, key=f"after_match:{self.state}")
+
+            if self.config.SHOW_MATCH_FIGHT_STAGE:
+                self.logger.info(
+                    f"matched: {self.state} ({wait['wait']:.2f}s, {wait['checks']} checks)"
+                )
+            self._after_match()
+            self._start_prefetch()
 
-                return self.state
+            return self.state
 
         # 匹配不到时报错
         self.logger.error(
@@ -268,6 +302,68 @@ class FightInfo(ABC):
             self.logger.log_image(image, f"match_{str(time.time())}.PNG")
         raise ImageNotFoundErr()
 
+    def _start_prefetch(self):
+        """在做出决策, 点击发出的同时在后台提前匹配当前状态的后继状态"""
+        if not self.config.FIGHT_PREFETCH or self.state not in self.prefetch_states:
+            return
+        states, timeouts = self._possible_states(self.state)
+        # 预取只使用输入之后的画面, 但输入后画面可能还没有切换, 不能预取当前状态
+        candidates = [
+            (state, timeout)
+            for state, timeout in zip(states, timeouts)
+            if state != self.state
+        ]
+        if not candidates:
+            return
+        states = [state for state, _ in candidates]
+        self._prefetch = (
+            self.state,
+            self.state_watcher.prefetch(
+                states,
+                [self.state2image[state][0] for state in states],
+                self._confidence(states),
+                max(timeout for _, timeout in candidates),
+                self.state_cadence,
+            ),
+        )
+
+    def _collect_prefetch(self, possible_states, images, confidence):
+        """停止后台预取, 预取到的状态是可能的状态时采用对应的截图
+
+        预取到的帧比 timer.screen 旧时 (如之后调用过 settle 或 update_screen),
+        保留 timer.screen 并在其上重新确认该状态, 保证状态与 timer.screen 一致
+
+        Returns:
+            int | None: 预取到的状态在 possible_states 中的下标
+        """
+        if self._prefetch is None:
+            return None
+        state, prefetch = self._prefetch
+        self._prefetch = None
+        result = prefetch.stop()
+        if (
+            state != self.last_state
+            or result is None
+            or result[0] not in possible_states
+        ):
+            return None
+        matched, frame_id, screen = result
+        index = possible_states.index(matched)
+        if frame_id > self.timer.frame_id:
+            self.timer.set_screen(frame_id, screen)
+        elif frame_id < self.timer.frame_id:
+            ret = self.timer.match_images([images[index]], confidence)
+            if first_match_index(ret, confidence) is None:
+                return None
+        self.state_watcher.last_wait = prefetch.last_wait
+        return index
+
+    def cancel_prefetch(self):
+        """停止后台预取, 在战斗流程中断时调用"""
+        if self._prefetch is not None:
+            self._prefetch[1].stop()
+            self._prefetch = None
+
     def _before_match(self):
         """每一轮尝试匹配状态前执行的操作"""
         pass
@@ -310,14 +406,17 @@ class FightPlan(ABC):
 
     def fight(self):
         self.Info.reset()  # 初始化战斗信息
+        self.Info.cancel_prefetch()
         while True:
             ret = self._make_decision()
             if ret == literals.FIGHT_CONTINUE_FLAG:
                 continue
             elif ret == "need SL":
+                self.Info.cancel_prefetch()
                 self._SL()
                 return "SL"
             elif ret == literals.FIGHT_END_FLAG:
+                self.Info.cancel_prefetch()
                 self.timer.set_page(self.Info.end_page)
                 self.fight_logs.append(self.Info.fight_history)
                 return "success"
@@ -357,6 +456,10 @@ class FightPlan(ABC):
                 if fight_flag == "dock is full":
                     return "dock is full"
                 raise RuntimeError(f"战斗进行时出现异常, 信息为 {fight_flag}")
+        if self.config.SHOW_MATCH_FIGHT_STAGE:
+            self.logger.debug(
+                f"状态转移耗时统计:\n{self.Info.state_watcher.stats.summary()}"
+            )
         return "OK"
 
     def run(self, same_work=False):
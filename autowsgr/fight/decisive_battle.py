@@ -364,16 +364,17 @@ class DecisiveBattle:
             except Exception as e:
                 self.timer.logger.error(f"读取购买费用出错，错误如下:\n {e}")
                 continue
-            ships.append(
-                self.timer.recognize(
-                    crop_image(
-                        screen, (SHIP_X[i][0], SHIP_Y[0]), (SHIP_X[i][1], SHIP_Y[1])
-                    ),
-                    candidates=self.timer.ship_names,
-                )[1]
-            )
             _costs.append(cost)
             real_position.append(i)
+        # 所有可购买位置的舰船名一次识别
+        ship_results = self.timer.recognize_batch(
+            [
+                crop_image(screen, (SHIP_X[i][0], SHIP_Y[0]), (SHIP_X[i][1], SHIP_Y[1]))
+                for i in real_position
+            ],
+            candidates=self.timer.ship_names,
+        )
+        ships = [result[1] for result in ship_results]
         # print("Scan result:", costs)
         costs = _costs
         selections = {
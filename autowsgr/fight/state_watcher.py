@@ -0,0 +1,299 @@
+"""战斗状态机的状态检测
+
+FightInfo.update_state 通过 StateWatcher 等待后继状态之一出现:
+    - 只在有新帧, 并且候选状态模板的搜索区域 (roi) 内的画面或整个画面的粗略取样发生变化时才重新匹配
+    - 每个状态有自己的轮询间隔, 没有匹配到时间隔逐渐增大到上限
+    - 每次状态转移的等待时间和匹配次数记录在 TransitionStats 中
+
+做出决策后, 在点击发出、画面切换之前, StatePrefetch 会在后台线程中提前截图并匹配可能的后继状态,
+画面一切换就能得到结果, 下一次 update_state 直接使用该结果.
+"""
+
+import threading as th
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from autowsgr.utils.api_image import MyTemplate, first_match_index, match_many
+
+# 状态的轮询间隔 (秒), 格式为 {状态名: (初始间隔, 最大间隔)}
+# 等待多个状态时使用其中最小的间隔
+STATE_CADENCE: Dict[str, Tuple[float, float]] = {
+    "proceed": (0, 0.1),
+    "fight_condition": (0, 0.2),
+    "spot_enemy_success": (0, 0.2),
+    "formation": (0, 0.2),
+    "fight_period": (0.1, 0.5),
+    "night": (0.3, 1.5),
+    "night_fight_period": (0.1, 0.5),
+    "result": (0.3, 1.5),
+}
+DEFAULT_CADENCE = (0.1, 0.5)
+BACKOFF = 1.5  # 没有匹配到时轮询间隔的增长倍数
+MIN_BACKOFF_GAP = 0.05  # 初始间隔为 0 时从该值开始增长
+# 搜索区域之外的粗略哈希: 每隔 COARSE_STEP 个像素取样, 并忽略低 COARSE_SHIFT 位
+COARSE_STEP = 8
+COARSE_SHIFT = 4
+
+
+def iter_group(image):
+    """state2image 中的模板可以是单个模板或模板列表"""
+    return [image] if isinstance(image, MyTemplate) else image
+
+
+class TransitionStats:
+    """状态转移的耗时统计
+
+    每种转移 (上一状态, 当前状态) 记录:
+        count: 次数
+        wait: 从开始等待到匹配成功的总时间
+        max_wait: 最长等待时间
+        lag: 匹配成功时距上一次检查的总时间, 即因轮询间隔可能多等待的时间
+        checks: 实际进行的模板匹配次数
+        skipped: 因搜索区域内画面没有变化而跳过的次数
+        prefetched: 由 StatePrefetch 提前匹配到的次数
+    """
+
+    def __init__(self) -> None:
+        self.records: Dict[Tuple[str, str], Dict[str, float]] = {}
+
+    def add(self, last_state, state, wait, lag, checks, skipped, prefetched=False):
+        record = self.records.setdefault(
+            (last_state, state),
+            {
+                "count": 0,
+                "wait": 0,
+                "max_wait": 0,
+                "lag": 0,
+                "checks": 0,
+                "skipped": 0,
+                "prefetched": 0,
+            },
+        )
+        record["count"] += 1
+        record["wait"] += wait
+        record["max_wait"] = max(record["max_wait"], wait)
+        record["lag"] += lag
+        record["checks"] += checks
+        record["skipped"] += skipped
+        record["prefetched"] += prefetched
+
+    def reset(self):
+        self.records = {}
+
+    def summary(self) -> str:
+        lines = []
+        for (last_state, state), record in self.records.items():
+            count = record["count"]
+            lines.append(
+                f"{last_state or '-'} -> {state}: {count} 次, "
+                f"平均等待 {record['wait'] / count:.2f}s, 最长 {record['max_wait']:.2f}s, "
+                f"平均延迟 {record['lag'] / count:.3f}s, "
+                f"匹配 {record['checks']} 次, 跳过 {record['skipped']} 次, "
+                f"预取 {record['prefetched']} 次"
+            )
+        return "\n".join(lines)
+
+
+class StateWatcher:
+    """等待若干个候选状态之一出现"""
+
+    def __init__(self, timer) -> None:
+        self.timer = timer
+        self.stats = TransitionStats()
+        self.last_wait = None  # 最近一次等待的统计信息
+
+    @staticmethod
+    def get_cadence(states: List[str], cadence: Dict[str, Tuple[float, float]]):
+        """候选状态中最小的 (初始间隔, 最大间隔)"""
+        values = [cadence.get(state, DEFAULT_CADENCE) for state in states]
+        return min(v[0] for v in values), min(v[1] for v in values)
+
+    def get_regions(self, images) -> Optional[List[Tuple[int, int, int, int]]]:
+        """候选模板的搜索区域, 有模板需要全屏搜索时返回 None"""
+        resolution = self.timer.resolution
+        w, h = resolution
+        regions = set()
+        for image in images:
+            for template in iter_group(image):
+                box = template.search_box(resolution)
+                if box == (0, 0, w, h):
+                    return None
+                regions.add(box)
+        return sorted(regions)
+
+    @staticmethod
+    def fingerprint(screen, regions, screen_hash=None):
+        """画面的哈希值, 与上一次相同时匹配结果也不会变化
+
+        有搜索区域时为区域内画面的精确哈希加上整个画面的粗略哈希:
+        模板在搜索区域内没有匹配到时会全屏重试 (参考 MyTemplate.match_screen),
+        区域外的画面变化也需要重新匹配
+        """
+        if regions is None:
+            return zlib.crc32(screen) if screen_hash is None else screen_hash
+        coarse = screen[::COARSE_STEP, ::COARSE_STEP] >> COARSE_SHIFT
+        crc = zlib.crc32(np.ascontiguousarray(coarse))
+        for x1, y1, x2, y2 in regions:
+            crc = zlib.crc32(np.ascontiguousarray(screen[y1:y2, x1:x2]), crc)
+        return crc
+
+    def wait(
+        self,
+        states: List[str],
+        images: list,
+        confidence: float,
+        timeout: float,
+        cadence: Dict[str, Tuple[float, float]] = None,
+        before_match=None,
+    ) -> Optional[int]:
+        """等待 images 中的一项出现
+
+        Args:
+            states (List[str]): 候选状态名, 与 images 一一对应, 用于确定轮询间隔
+            images (list): 每一项为 MyTemplate 或 MyTemplate 列表
+            timeout (float): 最长等待时间
+            cadence (dict, optional): 各状态的轮询间隔. Defaults to STATE_CADENCE.
+            before_match (callable, optional): 每次检查前执行的操作, 如点击加速
+
+        Returns:
+            int | None: 匹配到的下标, 超时返回 None.
+            本次等待的统计信息保存在 self.last_wait 中
+        """
+        timer = self.timer
+        min_gap, max_gap = self.get_cadence(states, cadence or STATE_CADENCE)
+        regions = self.get_regions(images)
+        start_time = last_check = time.time()
+        gap, fingerprint = min_gap, None
+        checks = skipped = 0
+        while True:
+            frame_id = timer.frame_id
+            if before_match is not None:
+                before_match()
+            if timer.frame_id == frame_id:
+                timer.update_screen()
+
+            now = time.time()
+            current = self.fingerprint(timer.screen, regions, timer.screen_hash)
+            if current != fingerprint:
+                fingerprint = current
+                checks += 1
+                ret = timer.match_images(images, confidence, stop_on_first=True)
+                index = first_match_index(ret, confidence)
+                if index is not None:
+                    self.last_wait = {
+                        "wait": time.time() - start_time,
+                        "lag": now - last_check,
+                        "checks": checks,
+                        "skipped": skipped,
+                    }
+                    return index
+                gap = min(max(gap, MIN_BACKOFF_GAP) * BACKOFF, max_gap)
+            else:
+                skipped += 1
+            last_check = now
+
+            # 按轮询间隔等待, 再等待新的一帧
+            remain = timeout - (time.time() - start_time)
+            if remain <= 0:
+                self.last_wait = {
+                    "wait": time.time() - start_time,
+                    "lag": 0,
+                    "checks": checks,
+                    "skipped": skipped,
+                }
+                return None
+            time.sleep(max(min(last_check + gap - time.time(), remain), 0))
+            remain = timeout - (time.time() - start_time)
+            timer.capture_backend.wait_frame(
+                timer.frame_id, min(remain, max(max_gap, 0.1)), gap=0
+            )
+
+    def prefetch(self, states, images, confidence, timeout, cadence=None):
+        """在后台线程中等待下一次输入之后 images 中的一项出现, 参考 StatePrefetch"""
+        prefetch = StatePrefetch(
+            self, states, images, confidence, timeout, cadence or STATE_CADENCE
+        )
+        prefetch.start()
+        return prefetch
+
+
+class StatePrefetch:
+    """在后台线程中提前匹配后继状态
+
+    只使用下一次输入 (点击、滑动) 发出之后截取的画面, 因此候选状态中不应包含当前状态.
+    后台线程不修改 timer.screen, 匹配到的帧由调用方通过 timer.set_screen 采用.
+    """
+
+    def __init__(
+        self, watcher: StateWatcher, states, images, confidence, timeout, cadence
+    ):
+        self.watcher = watcher
+        self.timer = watcher.timer
+        self.states = states
+        self.images = images
+        self.confidence = confidence
+        self.timeout = timeout
+        self.cadence = cadence
+        self.input_count = self.timer.input_count
+        self.result = None  # (匹配到的状态, 帧序号, 截图)
+        self.last_wait = None
+        self._stop = th.Event()
+        self._thread = th.Thread(target=self._run, name="state_prefetch", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """停止后台匹配
+
+        Returns:
+            tuple | None: (匹配到的状态, 帧序号, 截图), 没有匹配到时为 None
+        """
+        self._stop.set()
+        self._thread.join()
+        return self.result
+
+    def _run(self):
+        timer = self.timer
+        deadline = time.time() + self.timeout
+        # 输入发出之前的画面一定还是当前状态
+        while timer.input_count == self.input_count:
+            if self._stop.wait(0.01) or time.time() > deadline:
+                return
+
+        min_gap, max_gap = self.watcher.get_cadence(self.states, self.cadence)
+        regions = self.watcher.get_regions(self.images)
+        method = timer.config.MATCH_METHOD
+        start_time = time.time()
+        gap, fingerprint = min_gap, None
+        checks = skipped = 0
+        while not self._stop.is_set() and time.time() < deadline:
+            frame_id, screen = timer.capture_backend.latest_frame()
+            current = self.watcher.fingerprint(screen, regions)
+            if current != fingerprint:
+                fingerprint = current
+                checks += 1
+                ret = match_many(screen, self.images, self.confidence, True, method)
+                index = first_match_index(ret, self.confidence)
+                if index is not None:
+                    self.result = (self.states[index], frame_id, screen)
+                    self.last_wait = {
+                        "wait": time.time() - start_time,
+                        "lag": 0,
+                        "checks": checks,
+                        "skipped": skipped,
+                        "prefetched": True,
+                    }
+                    return
+                gap = min(max(gap, MIN_BACKOFF_GAP) * BACKOFF, max_gap)
+            else:
+                skipped += 1
+            if self._stop.wait(gap):
+                return
+            remain = deadline - time.time()
+            timer.capture_backend.wait_frame(
+                frame_id, min(remain, max(max_gap, 0.1)), gap=0
+            )
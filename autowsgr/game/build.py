@@ -77,11 +77,14 @@ class BuildManager:
             self.timer.goto_game_page("build_page")
         # 截图检测
         screen = self.timer.get_screen(self.timer.resolution, need_screen_shot=True)
-        for build_slot in range(4):
-            ocr_result = self.timer.recognize(
-                crop_image(screen, *ETA_AREAS[type][build_slot]),
-                allow_nan=True,
-            )
+        ocr_results = self.timer.recognize_batch(
+            [
+                crop_image(screen, *ETA_AREAS[type][build_slot])
+                for build_slot in range(4)
+            ],
+            allow_nan=True,
+        )
+        for build_slot, ocr_result in enumerate(ocr_results):
             if not ocr_result:
                 self.slot_eta[type][build_slot] = None
             elif "完成" in ocr_result[1] or "开始" in ocr_result[1]:
@@ -212,18 +215,19 @@ class BuildManager:
             resource_digits = [value_to_digits(res) for res in resources]
             for resource_id, dst in enumerate(resource_digits):
                 src = detect_build_resources(resource_id)
-                for digit in range(3):
-                    while src[digit] != dst[digit]:
-                        print(f"资源 {resource_id} 目前 {src} 目标 {dst}")
+                while src != dst:
+                    print(f"资源 {resource_id} 目前 {src} 目标 {dst}")
+                    # 每次滑动改变一位数字, 把三位数字需要的滑动一次发送, 再识别检查
+                    script = self.timer.gesture()
+                    for digit in range(3):
+                        x, y = RESOURCE_OPERATE_POSITIONS[resource_id][digit]
                         way = -1 if src[digit] < dst[digit] else 1
-                        self.timer.relative_swipe(
-                            *RESOURCE_OPERATE_POSITIONS[resource_id][digit],
-                            RESOURCE_OPERATE_POSITIONS[resource_id][digit][0],
-                            RESOURCE_OPERATE_POSITIONS[resource_id][digit][1]
-                            + way * RESOURCE_OPERATE_DELTA,
-                            duration=0.25,
-                        )
-                        src = detect_build_resources(resource_id)
+                        for _ in range(abs(src[digit] - dst[digit])):
+                            script.relative_swipe(
+                                x, y, x, y + way * RESOURCE_OPERATE_DELTA, 0.25
+                            )
+                    script.run()
+                    src = detect_build_resources(resource_id)
 
         # 检查资源有效性
         if resources:
@@ -62,12 +62,17 @@ def DestroyShip(timer: Timer):
         timer.goto_game_page("destroy_page")
     timer.set_page("destroy_page")
 
-    timer.click(90, 206, delay=1.5)  # 点添加
-    timer.relative_click(0.91, 0.3, delay=1.5)  # 快速选择
-    timer.relative_click(0.915, 0.906, delay=1.5)  # 确定
-    timer.relative_click(0.837, 0.646, delay=1.5)  # 卸下装备
-    timer.relative_click(0.9, 0.9, delay=1.5)  # 解装
-    timer.relative_click(0.38, 0.567, delay=1.5)  # 四星确认
+    # 中间不需要检查画面, 在设备上一次执行
+    (
+        timer.gesture()
+        .click(90, 206, delay=1.5)  # 点添加
+        .relative_click(0.91, 0.3, delay=1.5)  # 快速选择
+        .relative_click(0.915, 0.906, delay=1.5)  # 确定
+        .relative_click(0.837, 0.646, delay=1.5)  # 卸下装备
+        .relative_click(0.9, 0.9, delay=1.5)  # 解装
+        .relative_click(0.38, 0.567, delay=1.5)  # 四星确认
+        .run()
+    )
 
 
 def verify_team(timer: Timer):
@@ -86,10 +91,11 @@ def verify_team(timer: Timer):
     if timer.identify_page("fight_prepare_page") == False:
         raise ImageNotFoundErr("not on fight_prepare_page")
 
+    positions = [(64, 83), (186, 83), (310, 83), (430, 83)]
     for _ in range(5):
-        for i, position in enumerate([(64, 83), (186, 83), (310, 83), (430, 83)]):
-            if timer.check_pixel(position, bgr_color=(228, 132, 16)):
-                return i + 1
+        matched = timer.check_pixels(positions, bgr_color=(228, 132, 16))
+        if matched.any():
+            return int(matched.argmax()) + 1
         time.sleep(0.2)
         timer.update_screen()
 
@@ -259,11 +265,12 @@ def Supply(timer: Timer, ship_ids=[1, 2, 3, 4, 5, 6], try_times=0):
     if isinstance(ship_ids, int):
         ship_ids = [ship_ids]
 
-    timer.click(293, 420)
+    script = timer.gesture().click(293, 420)
     for x in ship_ids:
         if not isinstance(x, int):
             raise TypeError("ship must be represent as a int but get" + str(ship_ids))
-        timer.click(110 * x, 241)
+        script.click(110 * x, 241)
+    script.run()
 
     if timer.is_bad_network(0):
         timer.process_bad_network("supply ships")
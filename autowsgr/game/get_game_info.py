@@ -1,12 +1,9 @@
-import math
 import os
-import subprocess
 
 import numpy as np
-from PIL import Image as PIM
 
 from autowsgr.constants.colors import COLORS
-from autowsgr.constants.data_roots import OCR_ROOT, TUNNEL_ROOT
+from autowsgr.constants.data_roots import OCR_ROOT
 from autowsgr.constants.image_templates import IMG
 from autowsgr.constants.other_constants import (
     AADG,
@@ -35,8 +32,8 @@ from autowsgr.constants.other_constants import (
 from autowsgr.constants.positions import BLOOD_BAR_POSITION, TYPE_SCAN_AREA
 from autowsgr.timer import Timer
 from autowsgr.utils.api_image import crop_image
-from autowsgr.utils.io import delete_file, read_file, yaml_to_dict
-from autowsgr.utils.math_functions import CalcDis, CheckColor, matrix_to_str
+from autowsgr.utils.enemy_recognize import recognize_enemy
+from autowsgr.utils.io import yaml_to_dict
 
 
 class Resources:
@@ -99,13 +96,16 @@ def get_resources(timer: Timer):
     timer.update_screen()
     image = timer.screen
     ret = {}
-    for key in POS["main_page"]["resources"]:
-        image_crop = crop_image(image, *POS["main_page"]["resources"][key])
-        try:
-            ret[key] = timer.recognize_number(image_crop, "KM.")[1]
-        except:
+    keys = list(POS["main_page"]["resources"])
+    image_crops = [
+        crop_image(image, *POS["main_page"]["resources"][key]) for key in keys
+    ]
+    for key, result in zip(keys, timer.recognize_number_batch(image_crops, "KM.")):
+        if result is None:
             # 容错处理，如果监测出来不是数字则出错了
             timer.logger.error(f"读取{key}资源失败")
+            continue
+        ret[key] = result[1]
     timer.logger.info(ret)
     return ret
 
@@ -151,7 +151,7 @@ def get_loot_and_ship(timer: Timer):
 
 
 def get_enemy_condition(timer: Timer, type="exercise", *args, **kwargs):
-    """获取敌方舰船类型数据并返回一个字典, 具体图像识别为黑箱, 采用 C++ 实现
+    """获取敌方舰船类型数据并返回一个字典, 各位置的舰种由 autowsgr.utils.enemy_recognize.recognize_enemy 在进程内识别
 
     Args:
         type (str, optional): 描述情景. Defaults to 'exercise'.
@@ -200,23 +200,11 @@ def get_enemy_condition(timer: Timer, type="exercise", *args, **kwargs):
         # 特殊补给舰
         enemy_type_count[SAP] = 1
 
-    # 处理图像并将参数传递给识别图像的程序
-    img = PIM.fromarray(timer.screen).convert("L")
-    img = img.resize((960, 540))
-    input_path = os.path.join(TUNNEL_ROOT, "args.in")
-    output_path = os.path.join(TUNNEL_ROOT, "res.out")
-    delete_file(output_path)
-    args = "recognize\n6\n"
-    for i, area in enumerate(TYPE_SCAN_AREA[type]):
-        arr = np.array(img.crop(area))
-        args += matrix_to_str(arr)
-    with open(input_path, "w") as f:
-        f.write(args)
-    recognize_enemy_exe = os.path.join(TUNNEL_ROOT, "recognize_enemy.exe")
-    subprocess.run([recognize_enemy_exe, TUNNEL_ROOT])
-
-    # 获取并解析结果
-    res = read_file(os.path.join(TUNNEL_ROOT, "res.out")).split()
+    # 在进程内识别各个位置的舰种
+    img = np.asarray(timer.get_screen_pil("L", (960, 540)))
+    res = recognize_enemy(
+        [img[y1:y2, x1:x2] for x1, y1, x2, y2 in TYPE_SCAN_AREA[type]]
+    )
     enemy_type_count["ALL"] = 0
     for i, x in enumerate(res):
         enemy_type_count[x] += 1
@@ -231,6 +219,10 @@ def get_enemy_condition(timer: Timer, type="exercise", *args, **kwargs):
     return count
 
 
+# COLORS.BLOOD_COLORS[0] 的下标 -> 血量状态
+PREPARE_BLOOD_STATS = np.array([0, 1, 2, 2, -1])
+
+
 def detect_ship_stats(timer: Timer, type="prepare", previous=None):
     """检查我方舰船的血量状况(精确到红血黄血绿血)并返回
 
@@ -249,26 +241,17 @@ def detect_ship_stats(timer: Timer, type="prepare", previous=None):
 
     timer.update_screen()
     result = [-1, 0, 0, 0, 0, 0, 0]
-    for i in range(1, 7):
-        if type == "prepare":
-            pixel = timer.get_pixel(*BLOOD_BAR_POSITION[0][i])
-            result[i] = CheckColor(pixel, COLORS.BLOOD_COLORS[0])
-            if result[i] in [3, 2]:
-                result[i] = 2
-            elif result[i] == 0:
-                result[i] = 0
-            elif result[i] == 4:
-                result[i] = -1
-            else:
-                result[i] = 1
-        elif type == "sumup":
-            if previous and previous[i] == -1:
-                result[i] = -1
-                continue
-            pixel = timer.get_pixel(*BLOOD_BAR_POSITION[1][i])
-            result[i] = CheckColor(pixel, COLORS.BLOOD_COLORS[1])
-            if result[i] == 4:
-                result[i] = -1
+    if type == "prepare":
+        index, _ = timer.probe_colors(BLOOD_BAR_POSITION[0][1:], COLORS.BLOOD_COLORS[0])
+        # 绿色 -> 0, 黄色 -> 1, 红色和黑色 -> 2, 蓝色 (不存在) -> -1
+        result[1:] = PREPARE_BLOOD_STATS[index].tolist()
+    elif type == "sumup":
+        index, _ = timer.probe_colors(BLOOD_BAR_POSITION[1][1:], COLORS.BLOOD_COLORS[1])
+        result[1:] = index.tolist()
+        if previous:
+            result = [
+                -1 if previous[i] == -1 else stat for i, stat in enumerate(result)
+            ]
     return result
 
 
@@ -288,10 +271,14 @@ def get_exercise_stats(timer: Timer, robot=None):
         bool: 如果可挑战, 返回 True , 否则为 False, 1-index
     """
     timer.update_screen()
-    up = timer.check_pixel((933, 59), (177, 171, 176), distance=60)
-    down = timer.check_pixel((933, 489), (177, 171, 176), distance=60)
+    up, down = timer.check_pixels([(933, 59), (933, 489)], (177, 171, 176), distance=60)
     assert (up and down) == False
 
+    def challengeable(positions):
+        _, distances = timer.probe_colors(positions, [COLORS.CHALLENGE_BLUE])
+        return (distances <= 50).tolist()
+
+    positions = [(770, position * 110 - 10) for position in range(1, 5)]
     result = [
         None,
     ]
@@ -300,46 +287,19 @@ def get_exercise_stats(timer: Timer, robot=None):
         timer.update_screen()
         up = True
     if up:
-        for position in range(1, 5):
-            result.append(
-                math.sqrt(
-                    CalcDis(
-                        timer.get_pixel(770, position * 110 - 10), COLORS.CHALLENGE_BLUE
-                    )
-                )
-                <= 50
-            )
+        result += challengeable(positions)
         timer.swipe(800, 400, 800, 200)  # 下滑
         timer.update_screen()
-        result.append(
-            math.sqrt(
-                CalcDis(timer.get_pixel(770, 4 * 110 - 10), COLORS.CHALLENGE_BLUE)
-            )
-            <= 50
-        )
+        result += challengeable(positions[-1:])
         return result
     if down:
-        for position in range(1, 5):
-            result.append(
-                math.sqrt(
-                    CalcDis(
-                        timer.get_pixel(770, position * 110 - 10), COLORS.CHALLENGE_BLUE
-                    )
-                )
-                <= 50
-            )
+        result += challengeable(positions)
         if robot is not None:
             result.insert(1, robot)
         else:
             timer.swipe(800, 200, 800, 400)  # 上滑
             timer.update_screen()
-            result.insert(
-                1,
-                math.sqrt(
-                    CalcDis(timer.get_pixel(770, 4 * 110 - 10), COLORS.CHALLENGE_BLUE)
-                )
-                <= 50,
-            )
+            result.insert(1, challengeable(positions[-1:])[0])
 
             timer.swipe(800, 400, 800, 200)  # 下滑
 
@@ -353,12 +313,11 @@ def check_support_stats(timer: Timer):
         bool: 先判断是否为灰色，如果为灰色则返回True，然后判断是否开启，如果开启则返回True，否则返回False
     """
     timer.update_screen()
-    pixel = timer.get_pixel(623, 75)
-    d1 = CalcDis(pixel, COLORS.SUPPORT_ENABLE)  # 支援启用的黄色
-    d2 = CalcDis(pixel, COLORS.SUPPORT_DISABLE)  # 支援禁用的蓝色
-    d3 = CalcDis(pixel, COLORS.SUPPORT_ENLESS)  # 支援次数用尽的灰色
-    if d1 > d3 and d2 > d3:
+    # 支援启用的黄色, 支援禁用的蓝色, 支援次数用尽的灰色
+    colors = [COLORS.SUPPORT_ENABLE, COLORS.SUPPORT_DISABLE, COLORS.SUPPORT_ENLESS]
+    index, _ = timer.probe_colors([(623, 75)], colors)
+    if index[0] == 2:
         timer.logger.info("战役支援次数已用尽")
         return True
     else:
-        return d1 < d2
+        return bool(index[0] == 0)
@@ -1 +1,9 @@
-from .ocr_backend import EasyocrBackend, OCRBackend, PaddleOCRBackend
+from .adb_shell import ADB_SERVER, FakeAdbServer, PersistentShell
+from .capture_backend import (
+    CaptureBackend,
+    FakeFrameStream,
+    SnapshotCaptureBackend,
+    StreamCaptureBackend,
+)
+from .ocr_backend import EasyocrBackend, OCRBackend, OCRCache, PaddleOCRBackend
+from .ocr_server import OCRServer, RemoteOCRBackend
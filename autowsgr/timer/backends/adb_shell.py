@@ -0,0 +1,214 @@
+"""通过 adb server 保持的长连接 shell
+
+airtest 的 dev.shell 每条命令都会启动一次 adb 客户端, 并新建一个到设备的 shell 连接,
+点击、滑动等命令的耗时主要在建立连接上.
+PersistentShell 直接连接 adb server, 打开一个 "shell:sh" 连接后一直保持,
+每条命令写为一行, 再用前后两个标记行从输出中截取命令的输出和返回值.
+"""
+
+import re
+import socket
+import threading as th
+import time
+from typing import Tuple
+
+ADB_SERVER = ("127.0.0.1", 5037)
+
+# 标记在命令中被引号拆开, 使伪终端回显的命令行不会被误认为标记行
+BEGIN_MARKER = "__AWSGR_BEGIN__"
+END_MARKER = "__AWSGR_END__"
+COMMAND_FORMAT = (
+    'echo "__AWSGR_""BEGIN__"; {{ {cmd}; }} 2>&1; echo "__AWSGR_""END__" $?\n'
+)
+COMMAND_PATTERN = re.compile(
+    r'^echo "__AWSGR_""BEGIN__"; \{ (.*); \} 2>&1; echo "__AWSGR_""END__" \$\?$'
+)
+
+
+def _recv_exact(sock: socket.socket, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError("adb connection closed")
+        data += chunk
+    return data
+
+
+class PersistentShell:
+    """到设备的长连接 shell, 多个线程可以同时调用 run, 命令按顺序执行"""
+
+    RETRY_DELAY = 30  # 连接失败后多久再尝试重新连接
+
+    def __init__(self, serial, logger, address=ADB_SERVER, timeout=10) -> None:
+        """
+        Args:
+            serial (str): 设备序列号, 如 "emulator-5554" 或 "127.0.0.1:5555"
+            address (tuple, optional): adb server 地址 (host, port). Defaults to ADB_SERVER.
+            timeout (float, optional): 连接和每条命令的超时时间. Defaults to 10.
+        """
+        self.serial = serial
+        self.logger = logger
+        self.address = tuple(address)
+        self.timeout = timeout
+        self._sock = None
+        self._buffer = b""
+        self._retry_time = 0
+        self._lock = th.Lock()
+
+    def available(self):
+        """是否可以使用长连接, 连接失败后的 RETRY_DELAY 秒内不可用"""
+        return self._sock is not None or time.time() >= self._retry_time
+
+    def connect(self):
+        sock = socket.create_connection(self.address, timeout=self.timeout)
+        try:
+            self._request(sock, f"host:transport:{self.serial}")
+            self._request(sock, "shell:sh")
+        except BaseException:
+            sock.close()
+            raise
+        self._sock, self._buffer = sock, b""
+        self.logger.debug(f"已建立到 {self.serial} 的长连接 shell")
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    @staticmethod
+    def _request(sock, payload: str):
+        """adb server 协议: 发送 4 位十六进制长度 + 请求, 回复 OKAY 或 FAIL + 长度 + 错误信息"""
+        data = payload.encode()
+        sock.sendall(b"%04x" % len(data) + data)
+        status = _recv_exact(sock, 4)
+        if status != b"OKAY":
+            length = int(_recv_exact(sock, 4), 16)
+            message = _recv_exact(sock, length).decode(errors="replace")
+            raise ConnectionError(f"adb request '{payload}' failed: {message}")
+
+    def run(self, cmd: str, timeout=None) -> Tuple[str, int]:
+        """执行一条命令
+
+        Args:
+            timeout (float, optional): 本条命令的超时时间. Defaults to self.timeout.
+        Returns:
+            Tuple[str, int]: (输出, 返回值), 标准错误输出合并在输出中
+        Raises:
+            OSError, EOFError: 连接失败或命令超时, 此后 RETRY_DELAY 秒内 available() 为 False
+        """
+        if "\n" in cmd:
+            raise ValueError("command should be a single line")
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self.connect()
+                self._sock.settimeout(timeout or self.timeout)
+                self._sock.sendall(COMMAND_FORMAT.format(cmd=cmd).encode())
+                return self._read_result()
+            except (OSError, EOFError):
+                # 超时后连接中残留的输出无法与之后的命令对应, 直接断开
+                self.close()
+                self._retry_time = time.time() + self.RETRY_DELAY
+                raise
+
+    def _readline(self):
+        while b"\n" not in self._buffer:
+            data = self._sock.recv(65536)
+            if not data:
+                raise EOFError("adb shell closed")
+            self._buffer += data
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return line.rstrip(b"\r").decode("utf-8", errors="replace")
+
+    def _read_result(self):
+        # 伪终端会先回显命令和提示符
+        while not self._readline().endswith(BEGIN_MARKER):
+            pass
+        lines = []
+        while True:
+            line = self._readline()
+            # 命令输出不以换行结尾时, 结束标记会接在最后一行后面
+            pos = line.rfind(END_MARKER + " ")
+            if pos >= 0 and line[pos + len(END_MARKER) + 1 :].isdigit():
+                if pos > 0:
+                    lines.append(line[:pos])
+                return "\n".join(lines), int(line[pos + len(END_MARKER) + 1 :])
+            lines.append(line)
+
+
+class FakeAdbServer:
+    """本地模拟的 adb server, 用于在没有模拟器的情况下测试 PersistentShell
+
+    只支持 PersistentShell 用到的 host:transport 和 shell:sh 请求,
+    每条命令交给 handler 处理, 收到的命令按顺序记录在 commands 中
+
+    Example:
+        >>> server = FakeAdbServer(lambda cmd: ("", 0))
+        >>> server.start()
+        >>> shell = PersistentShell("emulator-5554", logger, server.address)
+    """
+
+    def __init__(self, handler=None, host="127.0.0.1"):
+        """
+        Args:
+            handler (callable, optional): 输入命令, 返回 (输出, 返回值). 默认输出为空, 返回值为 0
+        """
+        self.handler = handler or (lambda cmd: ("", 0))
+        self.commands = []
+        self._server = socket.create_server((host, 0))
+        self.address = (host, self._server.getsockname()[1])
+        self._running = False
+
+    def start(self):
+        self._running = True
+        th.Thread(target=self._serve, name="fake_adb", daemon=True).start()
+
+    def stop(self):
+        self._running = False
+        self._server.close()
+
+    def _serve(self):
+        while self._running:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            th.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn: socket.socket):
+        with conn, conn.makefile("rwb") as f:
+            try:
+                while True:
+                    length = f.read(4)
+                    if len(length) < 4:
+                        return
+                    payload = f.read(int(length, 16)).decode()
+                    if payload.startswith("host:transport:"):
+                        f.write(b"OKAY")
+                        f.flush()
+                    elif payload.startswith("shell:"):
+                        f.write(b"OKAY")
+                        f.flush()
+                        self._shell(f)
+                        return
+                    else:
+                        message = b"unknown request"
+                        f.write(b"FAIL%04x" % len(message) + message)
+                        f.flush()
+                        return
+            except OSError:
+                return
+
+    def _shell(self, f):
+        for line in f:
+            match = COMMAND_PATTERN.match(line.decode().rstrip("\n"))
+            if match is None:
+                continue
+            cmd = match.group(1)
+            self.commands.append(cmd)
+            output, code = self.handler(cmd)
+            if output and not output.endswith("\n"):
+                output += "\n"
+            f.write(f"{BEGIN_MARKER}\n{output}{END_MARKER} {code}\n".encode())
+            f.flush()
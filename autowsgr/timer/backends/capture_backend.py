@@ -0,0 +1,309 @@
+import socket
+import struct
+import threading as th
+import time
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+# minicap 协议: 连接后先发送 24 字节的全局头, 之后每一帧为 4 字节长度 + 帧数据
+# 全局头: version, size, pid, real_width, real_height, virtual_width, virtual_height, orientation, quirks
+MINICAP_BANNER = struct.Struct("<2B5I2B")
+FRAME_HEADER = struct.Struct("<I")
+JPEG_SOI = b"\xff\xd8"
+
+
+class CaptureBackend:
+    """截图后端基类
+
+    latest_frame 返回 (帧序号, 图像), 帧序号单调递增, 图像为 BGR 格式的 numpy 数组
+    """
+
+    def __init__(self, config, logger, dev) -> None:
+        self.config = config
+        self.logger = logger
+        self.dev = dev
+        self.frame_id = 0
+
+    def start(self):
+        """开始截图, 长连接后端在此建立连接"""
+        pass
+
+    def stop(self):
+        """停止截图并释放资源"""
+        pass
+
+    def latest_frame(self) -> Tuple[int, np.ndarray]:
+        """返回最新一帧的 (帧序号, 图像)"""
+        raise NotImplementedError
+
+    def wait_frame(self, after_id, timeout, gap=0.1) -> bool:
+        """等待帧序号大于 after_id 的新帧
+
+        无法得知新帧何时产生的后端只等待 gap 秒, 由调用方比较画面内容判断是否变化
+        Args:
+            after_id (int): 已经处理过的帧序号
+            timeout (float): 最长等待时间
+            gap (float): 轮询间隔
+        Returns:
+            bool: 是否可能有新帧
+        """
+        time.sleep(max(min(gap, timeout), 0))
+        return True
+
+
+class SnapshotCaptureBackend(CaptureBackend):
+    """每次调用 airtest 的 dev.snapshot 截图, 每一次截图都视为新的一帧"""
+
+    def __init__(self, config, logger, dev) -> None:
+        super().__init__(config, logger, dev)
+        self._lock = th.Lock()  # 后台线程也可能同时截图
+
+    def latest_frame(self):
+        with self._lock:
+            self.frame_id += 1
+            return self.frame_id, self.dev.snapshot(quality=99)
+
+
+class StreamCaptureBackend(CaptureBackend):
+    """长连接截图后端
+
+    后台线程持续从帧流中读取画面并解码到预分配的缓冲区, latest_frame 只拷贝最新一帧,
+    省去了每次截图的 JPEG 编码/解码往返.
+
+    帧来源:
+        address 为 None: 通过 airtest 的 screen_proxy 在模拟器上维持 minicap 长连接
+
+        address 为 "host:port": 直接连接 minicap 协议的帧流 (例如自行转发的流或 FakeFrameStream),
+        帧数据可以是 JPEG, 也可以是与画面等大的原始 BGR 像素 (scrcpy 风格的 raw 流),
+        原始像素会直接写入预分配的缓冲区
+
+    后台线程读取失败 (包括 airtest 的 AdbError) 时会断开并重新连接, 在收到新帧之前
+    latest_frame 退回 dev.snapshot, 不会一直返回断开前的旧画面
+    """
+
+    FIRST_FRAME_TIMEOUT = 10
+    RECONNECT_DELAY = 1
+
+    def __init__(self, config, logger, dev, address=None) -> None:
+        super().__init__(config, logger, dev)
+        self.address = address
+        self._sock = None
+        self._banner = None
+        self._cond = th.Condition()
+        self._front = None  # 最新的完整帧, 只在持有锁时读取或交换
+        self._back = None  # 后台线程正在写入的帧
+        self._payload = bytearray()
+        self._running = False
+        self._thread = None
+        self._alive = False  # 帧流是否正常, 读取失败后为 False, 收到新帧后恢复
+        self._fallback = False  # latest_frame 当前是否退回单次截图, 只用于记录切换
+
+    # ======== 连接管理 ========
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = th.Thread(target=self._run, name="capture_stream", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._close()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _connect(self):
+        if self.address is None:
+            return
+        host, port = self.address.rsplit(":", 1)
+        self._sock = socket.create_connection((host, int(port)), timeout=5)
+        self._sock.settimeout(5)
+        self._banner = MINICAP_BANNER.unpack(self._recv_exact(MINICAP_BANNER.size))
+        width, height = self._banner[5], self._banner[6]
+        self._back = np.empty((height, width, 3), dtype=np.uint8)
+        self.logger.info(f"capture stream connected: {self.address} ({width}x{height})")
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+        if self.address is None and self.dev is not None:
+            # 下一次 get_frame_from_stream 会重新启动 minicap
+            try:
+                self.dev.screen_proxy.teardown_stream()
+            except Exception as e:
+                self.logger.debug(f"failed to tear down capture stream: {e}")
+
+    # ======== 后台读取 ========
+    def _run(self):
+        try:
+            while self._running:
+                try:
+                    if self.address is not None and self._sock is None:
+                        self._connect()
+                    if not self._read_frame():
+                        continue
+                except Exception as e:
+                    if not self._running:
+                        break
+                    self._alive = False
+                    self.logger.warning(
+                        f"capture stream interrupted: {e!r}, reconnecting"
+                    )
+                    self._close()
+                    time.sleep(self.RECONNECT_DELAY)
+                    continue
+
+                with self._cond:
+                    self._front, self._back = self._back, self._front
+                    self.frame_id += 1
+                    self._alive = True
+                    self._cond.notify_all()
+                if self._back is None:
+                    self._back = np.empty_like(self._front)
+        finally:
+            self._alive = False
+
+    def _read_frame(self) -> bool:
+        """读取一帧并写入 self._back, 成功返回 True"""
+        if self.address is None:
+            data = self.dev.screen_proxy.get_frame_from_stream()
+            if data is None:
+                return False
+            return self._decode(memoryview(data))
+
+        size = FRAME_HEADER.unpack(self._recv_exact(FRAME_HEADER.size))[0]
+        if self._back is not None and size == self._back.nbytes:
+            # 原始像素直接写入预分配的缓冲区
+            self._recv_into(memoryview(self._back.reshape(-1)), size)
+            return True
+        if len(self._payload) < size:
+            self._payload = bytearray(size)
+        view = memoryview(self._payload)[:size]
+        self._recv_into(view, size)
+        return self._decode(view)
+
+    def _decode(self, data: memoryview) -> bool:
+        if data[:2].tobytes() != JPEG_SOI:
+            self.logger.warning(f"unknown frame format, size: {len(data)}")
+            return False
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return False
+        if self._back is None or self._back.shape != image.shape:
+            self._back = np.empty_like(image)
+        np.copyto(self._back, image)
+        return True
+
+    def _recv_exact(self, size) -> bytes:
+        buffer = bytearray(size)
+        self._recv_into(memoryview(buffer), size)
+        return bytes(buffer)
+
+    def _recv_into(self, view: memoryview, size):
+        received = 0
+        while received < size:
+            n = self._sock.recv_into(view[received:], size - received)
+            if n == 0:
+                raise EOFError("capture stream closed")
+            received += n
+
+    # ======== 对外接口 ========
+    def latest_frame(self):
+        with self._cond:
+            if self._front is None and not self._fallback:
+                # 只在帧流还没有出现过失败时等待第一帧
+                self._cond.wait_for(lambda: self._alive, self.FIRST_FRAME_TIMEOUT)
+            if self._alive:
+                if self._fallback:
+                    self._fallback = False
+                    self.logger.info("capture stream recovered")
+                return self.frame_id, self._front.copy()
+
+            # 帧流不可用时退回单次截图, 保证脚本可以继续运行
+            if not self._fallback:
+                self._fallback = True
+                self.logger.warning("capture stream unavailable, fall back to snapshot")
+            self.frame_id += 1
+            frame_id = self.frame_id
+        return frame_id, self.dev.snapshot(quality=99)
+
+    def wait_frame(self, after_id, timeout, gap=0.1):
+        # 帧流只在画面变化时推送新帧, 直接阻塞到新帧到达
+        if not self._alive:
+            return super().wait_frame(after_id, timeout, gap)
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self.frame_id > after_id, max(timeout, 0)
+            )
+
+
+class FakeFrameStream:
+    """本地模拟的 minicap 帧流, 用于在没有模拟器的情况下测试 StreamCaptureBackend
+
+    Example:
+        >>> stream = FakeFrameStream([frame1, frame2], fps=30)
+        >>> stream.start()
+        >>> backend = StreamCaptureBackend(config, logger, None, address=stream.address)
+    """
+
+    def __init__(self, frames: List[np.ndarray], fps=30, jpeg=False, host="127.0.0.1"):
+        """
+        Args:
+            frames: 循环发送的 BGR 图像, 尺寸需一致
+            fps: 发送帧率
+            jpeg: 为 True 时以 JPEG 发送, 否则发送原始像素
+        """
+        self.frames = frames
+        self.fps = fps
+        self.jpeg = jpeg
+        self._server = socket.create_server((host, 0))
+        self.address = f"{host}:{self._server.getsockname()[1]}"
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = th.Thread(target=self._serve, name="fake_stream", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._server.close()
+
+    def _serve(self):
+        while self._running:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            with conn:
+                try:
+                    self._send_frames(conn)
+                except OSError:
+                    continue
+
+    def _send_frames(self, conn: socket.socket):
+        height, width = self.frames[0].shape[:2]
+        conn.sendall(
+            MINICAP_BANNER.pack(
+                1, MINICAP_BANNER.size, 0, width, height, width, height, 0, 0
+            )
+        )
+        i = 0
+        while self._running:
+            frame = self.frames[i % len(self.frames)]
+            data = (
+                cv2.imencode(".jpg", frame)[1].tobytes()
+                if self.jpeg
+                else frame.tobytes()
+            )
+            conn.sendall(FRAME_HEADER.pack(len(data)) + data)
+            i += 1
+            time.sleep(1 / self.fps)
@@ -0,0 +1,247 @@
+import atexit
+import os
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+GLYPH_SIZE = 16  # 字符归一化后的边长
+MIN_AREA = 2  # 小于该面积的连通域视为噪点
+MERGE_OVERLAP = 0.5  # 横向重叠超过较窄者宽度的该比例时合并为一个字符
+WORD_GAP = 1.0  # 字符间距超过行高的该比例时视为两个数字
+MIN_SCORE = 0.88  # 低于该得分的字符视为无法识别
+MIN_MARGIN = 0.03  # 最佳字符与其他字符的得分差距需要超过该值
+NEW_VARIANT_SCORE = 0.97  # 与已有模板的得分低于该值时才作为新的模板加入
+MAX_TEMPLATES_PER_CHAR = 5
+LEARN_MIN_SCORE = 0.95  # OCR 模型的得分不低于该值时才用其结果学习
+CONFIRMATIONS = 3  # 同一字形被识别为同一字符这么多次后才作为模板使用
+MAX_CANDIDATES_PER_CHAR = 20
+
+
+class TemplateDigitRecognizer:
+    """基于字形模板的轻量数字识别
+
+    游戏中数字的字体是固定的, 把裁剪出的图像二值化后按连通域切分成单个字符,
+    与字形模板逐个比较即可识别, 不需要运行 OCR 模型.
+
+    字形模板从 OCR 模型的识别结果中学习: 无法识别时由调用方使用 OCR 模型识别,
+    再调用 learn 把切分出的字符与识别结果一一对应加入候选, 退出时保存到 path.
+    同一字形被高得分地识别为同一字符 CONFIRMATIONS 次后才作为模板使用,
+    与其他字符的候选或模板相同的字形不会被学习, 避免把 OCR 的个别误识别固定下来.
+    """
+
+    def __init__(self, logger, path="") -> None:
+        """
+        Args:
+            path (str): 字形模板文件 (.npz) 路径, 为空时不读取也不保存
+        """
+        self.logger = logger
+        self.path = path
+        self.templates: Dict[str, List[np.ndarray]] = {}
+        self.candidates: Dict[str, List[list]] = {}  # 字符 -> [[字形, 观察次数], ...]
+        self._dirty = False
+        if self.path:
+            self.load()
+            atexit.register(self.save)
+
+    # ======== 模板读写 ========
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        data = np.load(self.path)
+        # 没有观察次数的旧文件中的字形未经确认, 全部作为候选
+        counts = data["counts"] if "counts" in data else np.ones(len(data["chars"]))
+        for char, glyph, count in zip(data["chars"], data["glyphs"], counts):
+            if count >= CONFIRMATIONS:
+                self.templates.setdefault(str(char), []).append(glyph)
+            else:
+                self.candidates.setdefault(str(char), []).append([glyph, int(count)])
+
+    def save(self):
+        if not self._dirty:
+            return
+        entries = [
+            (char, glyph, CONFIRMATIONS)
+            for char, glyphs in self.templates.items()
+            for glyph in glyphs
+        ] + [
+            (char, glyph, count)
+            for char, candidates in self.candidates.items()
+            for glyph, count in candidates
+        ]
+        if not entries:
+            return
+        chars, glyphs, counts = zip(*entries)
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            np.savez_compressed(
+                self.path,
+                chars=np.array(chars),
+                glyphs=np.stack(glyphs),
+                counts=np.array(counts),
+            )
+            self._dirty = False
+        except OSError as e:
+            self.logger.warning(f"保存数字字形模板失败: {e}")
+
+    # ======== 切分 ========
+    @staticmethod
+    def segment(img) -> list:
+        """把图像切分为若干个数字, 每个数字是若干个归一化后的字符
+
+        Returns:
+            list: [(数字的中心坐标, [字符, ...]), ...]
+        """
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        # 文字总是占少数的一方
+        if cv2.countNonZero(binary) * 2 > binary.size:
+            binary = cv2.bitwise_not(binary)
+        n, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        boxes = [list(stats[i, :4]) for i in range(1, n) if stats[i, 4] >= MIN_AREA]
+        if not boxes:
+            return []
+
+        # 合并横向重叠的连通域 (断开的笔画)
+        boxes.sort(key=lambda box: box[0])
+        merged = [boxes[0]]
+        for x, y, w, h in boxes[1:]:
+            px, py, pw, ph = merged[-1]
+            overlap = min(px + pw, x + w) - max(px, x)
+            if overlap > MERGE_OVERLAP * min(pw, w):
+                x0, y0 = min(px, x), min(py, y)
+                x1, y1 = max(px + pw, x + w), max(py + ph, y + h)
+                merged[-1] = [x0, y0, x1 - x0, y1 - y0]
+            else:
+                merged.append([x, y, w, h])
+
+        top = min(y for _, y, _, _ in merged)
+        bottom = max(y + h for _, y, _, h in merged)
+        height = bottom - top
+        words, last_right = [], None
+        for x, y, w, h in merged:
+            if last_right is None or x - last_right > WORD_GAP * height:
+                words.append([])
+            last_right = x + w
+            # 保留字符在行内的竖直位置, 并按行高补成正方形, 以区分 "." 和 "1" 这类字符
+            side = max(height, w)
+            glyph = np.zeros((side, side), dtype=np.uint8)
+            left = (side - w) // 2
+            glyph[:height, left : left + w] = binary[top:bottom, x : x + w]
+            glyph = cv2.resize(
+                glyph, (GLYPH_SIZE, GLYPH_SIZE), interpolation=cv2.INTER_AREA
+            )
+            words[-1].append(((x, x + w), glyph.astype(np.float32) / 255))
+
+        result = []
+        for word in words:
+            x0, x1 = word[0][0][0], word[-1][0][1]
+            center = ((x0 + x1) / 2, (top + bottom) / 2)
+            result.append((center, [glyph for _, glyph in word]))
+        return result
+
+    # ======== 识别 ========
+    def classify(self, glyph, allowlist=None):
+        """返回 (字符, 得分), 无法确定时字符为 None"""
+        scores = {}
+        for char, templates in self.templates.items():
+            if allowlist is not None and char not in allowlist:
+                continue
+            scores[char] = max(
+                1 - float(np.abs(template - glyph).mean()) for template in templates
+            )
+        if not scores:
+            return None, 0
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        char, score = ranked[0]
+        if score < MIN_SCORE:
+            return None, score
+        if len(ranked) > 1 and score - ranked[1][1] < MIN_MARGIN:
+            return None, score
+        return char, score
+
+    def read_text(self, img, allowlist: str = None) -> Optional[list]:
+        """识别图像中的数字, 格式与 OCRBackend.read_text 相同
+
+        Returns:
+            list | None: 识别结果, 有字符无法确定时返回 None
+        """
+        if not self.templates or not isinstance(img, np.ndarray):
+            return None
+        words = self.segment(img)
+        if not words:
+            return None
+        results = []
+        for center, glyphs in words:
+            text, min_score = "", 1.0
+            for glyph in glyphs:
+                char, score = self.classify(glyph, allowlist)
+                if char is None:
+                    return None
+                text += char
+                min_score = min(min_score, score)
+            results.append((center, text, min_score))
+        return results
+
+    def learn(self, img, results):
+        """根据 OCR 模型的识别结果学习字形模板
+
+        只有切分出的数字个数和每个数字的字符数都与识别结果一致,
+        并且每个结果的得分都不低于 LEARN_MIN_SCORE 时才会学习
+
+        Args:
+            img (np.ndarray): 被识别的图像
+            results (list): OCR 模型对该图像的识别结果 (read_text 格式)
+        """
+        if not isinstance(img, np.ndarray):
+            return
+        if any(len(result) < 3 or result[2] < LEARN_MIN_SCORE for result in results):
+            return
+        texts = [str(result[1]).replace(" ", "") for result in results]
+        words = self.segment(img)
+        if not texts or len(words) != len(texts):
+            return
+        if any(len(glyphs) != len(text) for (_, glyphs), text in zip(words, texts)):
+            return
+        for (_, glyphs), text in zip(words, texts):
+            for char, glyph in zip(text, glyphs):
+                self._observe(char, glyph)
+
+    @staticmethod
+    def _similar(a, b):
+        return 1 - np.abs(a - b).mean() >= NEW_VARIANT_SCORE
+
+    def _observe(self, char, glyph):
+        """记录一次 "glyph 是 char" 的观察, 观察次数足够时把候选加入模板"""
+        templates = self.templates.get(char, [])
+        if any(self._similar(template, glyph) for template in templates):
+            return
+        # 与其他字符的字形相同, 说明 OCR 的结果之间有矛盾: 与未确认的候选矛盾时两者都丢弃
+        conflict = False
+        for other in set(self.templates) | set(self.candidates):
+            if other == char:
+                continue
+            if any(self._similar(t, glyph) for t in self.templates.get(other, [])):
+                return
+            others = self.candidates.get(other, [])
+            kept = [c for c in others if not self._similar(c[0], glyph)]
+            if len(kept) < len(others):
+                self.candidates[other] = kept
+                self._dirty = conflict = True
+        if conflict:
+            return
+
+        candidates = self.candidates.setdefault(char, [])
+        for i, (candidate, count) in enumerate(candidates):
+            if self._similar(candidate, glyph):
+                self._dirty = True
+                if count + 1 < CONFIRMATIONS:
+                    candidates[i][1] = count + 1
+                    return
+                del candidates[i]
+                if len(templates) < MAX_TEMPLATES_PER_CHAR:
+                    self.templates.setdefault(char, []).append(candidate)
+                return
+        if len(candidates) < MAX_CANDIDATES_PER_CHAR:
+            candidates.append([glyph, 1])
+            self._dirty = True
@@ -1,20 +1,280 @@
+import atexit
+import hashlib
 import os
-import subprocess
+import pickle
+import threading as th
+import time
+from collections import OrderedDict
 from typing import List, Tuple
 
 import cv2
 import numpy as np
-from thefuzz import process
 
-from autowsgr.constants.data_roots import TUNNEL_ROOT
+from autowsgr.constants.data_roots import USER_DATA_ROOT
+from autowsgr.timer.backends.digit_recognizer import TemplateDigitRecognizer
+from autowsgr.timer.backends.preprocess import run_pipeline
+from autowsgr.utils.api_image import locate_text_boxes
+from autowsgr.utils.candidate_index import CandidateIndex
+
+
+def scale_position(position, scale):
+    """把预处理后图像上的坐标换算回原图坐标"""
+    if scale == 1:
+        return position
+    return tuple(x / scale for x in position)
+
+
+STITCH_GAP = 16  # 拼接图片时相邻图片之间的间隔
+# 拼接后图片的最长边上限, 与 paddleocr 检测模型的 det_limit_side_len 一致, 超过时检测前会被缩小
+STITCH_MAX_SIDE = 960
+
+
+def stitch_groups(imgs: List[np.ndarray], max_side=STITCH_MAX_SIDE):
+    """把图片按顺序分组, 使每组用 stitch_images 拼接后的高度不超过 max_side
+
+    单张图片本身超过 max_side 时单独成组
+
+    Returns:
+        List[List[int]]: 每组图片在 imgs 中的下标
+    """
+    groups, group, max_h, total_h = [], [], 0, 0
+    for i, img in enumerate(imgs):
+        h = img.shape[0]
+        new_max = max(max_h, h)
+        gap = max(STITCH_GAP, new_max // 2)
+        if group and total_h + h + 2 * gap * (len(group) + 1) > max_side:
+            groups.append(group)
+            group, new_max, total_h = [], h, 0
+        group.append(i)
+        max_h, total_h = new_max, total_h + h
+    if group:
+        groups.append(group)
+    return groups
+
+
+def stitch_images(imgs: List[np.ndarray]):
+    """把多张图片纵向拼接为一张, 图片之间用各图片边框的中位颜色填充的间隔隔开
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (拼接后的图片, 每张图片的纵坐标偏移)
+    """
+    imgs = [
+        cv2.cvtColor(img, cv2.COLOR_GRAY2BGR) if img.ndim == 2 else img for img in imgs
+    ]
+    width = max(img.shape[1] for img in imgs)
+    gap = max(STITCH_GAP, max(img.shape[0] for img in imgs) // 2)
+    parts, offsets, y = [], [], 0
+    for img in imgs:
+        border = np.concatenate([img[0], img[-1], img[:, 0], img[:, -1]])
+        part = cv2.copyMakeBorder(
+            img,
+            gap,
+            gap,
+            0,
+            width - img.shape[1],
+            cv2.BORDER_CONSTANT,
+            value=np.median(border, axis=0).tolist(),
+        )
+        parts.append(part)
+        offsets.append(y + gap)
+        y += part.shape[0]
+    return np.vstack(parts), np.array(offsets)
+
+
+class OCRCache:
+    """OCR 结果的 LRU 缓存
+
+    以识别参数和图像尺寸的哈希分桶, 桶内逐个比较图像: 各像素的差值都不超过 PIXEL_TOLERANCE 时
+    视为同一画面, 直接返回上一次的识别结果. 截图编码带来的细微噪声不会导致缓存失效,
+    而文字变化会使部分像素产生很大的差值, 不会命中.
+    """
+
+    PIXEL_TOLERANCE = 16
+
+    def __init__(self, size=256, path="", logger=None) -> None:
+        """
+        Args:
+            size (int): 最多缓存的结果数, 为 0 时不缓存
+            path (str): 持久化文件路径, 为空时不持久化
+        """
+        self.size = size
+        self.path = path
+        self.logger = logger
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # 序号 -> (桶, 图像, 识别结果), 按最近使用排序
+        self._buckets = {}  # 桶 -> [序号, ...]
+        self._next_id = 0
+        self._lock = th.Lock()
+        if self.path:
+            self.load()
+            atexit.register(self.save)
+
+    def make_key(self, img, *args):
+        """计算缓存键 (桶, 图像), 图像不是 numpy 数组或不缓存时返回 None
+
+        Args:
+            args: 识别参数, 需要有稳定的 repr
+        """
+        if not self.size or not isinstance(img, np.ndarray) or img.dtype != np.uint8:
+            return None
+        h = hashlib.blake2b(digest_size=16)
+        h.update(repr((img.shape, args)).encode())
+        return h.digest(), img
+
+    def same_image(self, a, b):
+        return not np.any(cv2.absdiff(a, b) > self.PIXEL_TOLERANCE)
+
+    def _find(self, key):
+        bucket, img = key
+        for entry_id in self._buckets.get(bucket, []):
+            if self.same_image(self._data[entry_id][1], img):
+                return entry_id
+        return None
+
+    def get(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            entry_id = self._find(key)
+            if entry_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._data.move_to_end(entry_id)
+            return list(self._data[entry_id][2])
+
+    def put(self, key, results):
+        if key is None:
+            return
+        with self._lock:
+            entry_id = self._find(key)
+            if entry_id is None:
+                self._add(key[0], np.array(key[1]), list(results))
+            else:
+                bucket, img, _ = self._data[entry_id]
+                self._data[entry_id] = (bucket, img, list(results))
+                self._data.move_to_end(entry_id)
+            self._evict()
+
+    def _add(self, bucket, img, results):
+        entry_id = self._next_id
+        self._next_id += 1
+        self._data[entry_id] = (bucket, img, results)
+        self._buckets.setdefault(bucket, []).append(entry_id)
+
+    def _evict(self):
+        while len(self._data) > self.size:
+            entry_id, (bucket, _, _) = self._data.popitem(last=False)
+            ids = self._buckets[bucket]
+            ids.remove(entry_id)
+            if not ids:
+                del self._buckets[bucket]
+
+    def cache_info(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                entries = pickle.load(f)
+            # 旧格式的条目 (键, 结果) 没有保存图像, 无法比较, 直接丢弃
+            for entry in entries:
+                if isinstance(entry, tuple) and len(entry) == 3:
+                    self._add(*entry)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            if self.logger is not None:
+                self.logger.warning(f"读取 OCR 缓存失败: {e}")
+            self._data, self._buckets = OrderedDict(), {}
+        self._evict()
+
+    def save(self):
+        if self.logger is not None:
+            self.logger.debug(f"OCR 缓存统计: {self.cache_info()}")
+        with self._lock:
+            data = list(self._data.values())
+        try:
+            with open(self.path, "wb") as f:
+                pickle.dump(data, f)
+        except OSError as e:
+            if self.logger is not None:
+                self.logger.warning(f"保存 OCR 缓存失败: {e}")
 
 
 class OCRBackend:
     WORD_REPLACE = None  # 记录中文ocr识别的错误用于替换。主要针对词表缺失的情况，会导致稳定的识别为另一个字
+    MAX_CANDIDATE_INDEXES = 8
 
     def __init__(self, config, logger):
         self.config = config
         self.logger = logger
+        self.cache = OCRCache(config.OCR_CACHE_SIZE, config.OCR_CACHE_PATH, logger)
+        self._digit_recognizer = None
+        self._digit_lock = th.Lock()
+        self._candidate_indexes = OrderedDict()
+        self._reader = None
+        self._ready = th.Event()
+        self._load_lock = th.Lock()
+        self._load_error = None
+
+    @property
+    def digit_recognizer(self) -> TemplateDigitRecognizer:
+        """字形模板数字识别, 第一次使用 template 方式识别数字时才创建"""
+        with self._digit_lock:
+            if self._digit_recognizer is None:
+                path = self.config.DIGIT_GLYPH_PATH
+                if path:
+                    path = os.path.join(USER_DATA_ROOT, os.path.expanduser(path))
+                self._digit_recognizer = TemplateDigitRecognizer(self.logger, path)
+            return self._digit_recognizer
+
+    # ======== 模型加载 ========
+    def load_model(self):
+        """加载 OCR 模型并返回, 由子类实现"""
+        raise NotImplementedError
+
+    def _load(self):
+        """加载 OCR 模型, 失败时记录错误, 下一次访问 reader 时重新加载"""
+        with self._load_lock:
+            if self._ready.is_set():
+                return
+            start = time.time()
+            try:
+                self._reader = self.load_model()
+            except Exception as e:
+                self._load_error = e
+                self.logger.error(f"OCR 模型加载失败: {e}")
+                return
+            self._load_error = None
+            self._ready.set()
+            self.logger.info(f"OCR 模型加载完成, 用时 {time.time() - start:.2f}s")
+
+    def warm_up(self):
+        """在后台线程中加载 OCR 模型"""
+        if self._ready.is_set():
+            return
+        th.Thread(target=self._load, name="ocr_warm_up", daemon=True).start()
+
+    @property
+    def ready(self):
+        """OCR 模型是否已经加载完成"""
+        return self._ready.is_set()
+
+    @property
+    def reader(self):
+        """OCR 模型, 尚未加载完成时阻塞到加载完成 (没有在后台加载时在当前线程加载)
+
+        之前加载失败时重新加载, 仍然失败时抛出加载时的异常
+        """
+        if not self._ready.is_set():
+            start = time.time()
+            self._load()
+            self.logger.debug(f"等待 OCR 模型加载 {time.time() - start:.2f}s")
+            if not self._ready.is_set():
+                raise self._load_error
+        return self._reader
 
     def read_text(
         self, img, allowlist: List[str] = None, sort: str = "left-to-right", **kwargs
@@ -22,6 +282,63 @@ class OCRBackend:
         """识别文字的具体实现，返回字符串格式识别结果"""
         raise NotImplementedError
 
+    def read_text_batch(self, imgs, allowlist: List[str] = None, **kwargs):
+        """一次识别多张图片, 返回与 imgs 一一对应的 read_text 结果
+
+        多张图片时先拼接成长图, 每张长图只做一次检测和一批识别, 再按位置把结果分回各张图片,
+        坐标为相对各自图片的坐标. 长图的高度不超过 STITCH_MAX_SIDE, 避免检测前被缩小
+        """
+        if len(imgs) == 1 or not all(isinstance(img, np.ndarray) for img in imgs):
+            return [self.read_text(img, allowlist, **kwargs) for img in imgs]
+
+        results = [[] for _ in imgs]
+        for group in stitch_groups(imgs):
+            if len(group) == 1:
+                results[group[0]] = self.read_text(imgs[group[0]], allowlist, **kwargs)
+                continue
+            canvas, offsets = stitch_images([imgs[i] for i in group])
+            for (x, y), text, score in self.read_text(canvas, allowlist, **kwargs):
+                j = int(np.searchsorted(offsets, y, side="right")) - 1
+                if 0 <= j < len(group) and y - offsets[j] < imgs[group[j]].shape[0]:
+                    results[group[j]].append(((x, y - offsets[j]), text, score))
+        return results
+
+    @staticmethod
+    def preprocess(img, rgb_select=None, tolerance=30, steps=None):
+        """执行预处理流程, 返回 (处理后的图像, 缩放倍数)
+
+        Args:
+            rgb_select: 只保留该颜色 (RGB) 的像素, 相当于第一步为 ("select_color", rgb_select, tolerance)
+            steps: 其余预处理步骤, 参考 autowsgr.timer.backends.preprocess
+        """
+        pipeline = (
+            [] if rgb_select is None else [("select_color", rgb_select, tolerance)]
+        )
+        return run_pipeline(img, pipeline + list(steps or []))
+
+    def candidate_index(self, candidates: List[str]) -> CandidateIndex:
+        """返回候选词列表的索引, 列表内容变化 (如追加舰船名) 时重新建立"""
+        key = id(candidates)
+        cached = self._candidate_indexes.get(key)
+        if (
+            cached is None
+            or cached[0] is not candidates
+            or len(cached[1]) != len(candidates)
+        ):
+            cached = (candidates, CandidateIndex(candidates))
+            self._candidate_indexes[key] = cached
+            while len(self._candidate_indexes) > self.MAX_CANDIDATE_INDEXES:
+                self._candidate_indexes.popitem(last=False)
+        self._candidate_indexes.move_to_end(key)
+        return cached[1]
+
+    def post_process_text(self, t, candidates=None):
+        for k, v in self.WORD_REPLACE.items():
+            t = t.replace(k, v)
+        if candidates:
+            t = self.candidate_index(candidates).extract_one(t)
+        return t
+
     def recognize(
         self,
         img,
@@ -31,41 +348,86 @@ class OCRBackend:
         allow_nan=False,
         rgb_select=None,
         tolerance=30,
+        preprocess=None,
         **kwargs,
     ):
-        """识别任意字符串"""
-
-        def pre_process_rgb(img, rgb_select=None, tolerance=30):
-            # 如果没有提供rgb_select，直接返回原始图像
-            if rgb_select is None:
-                return img
-
-            # 将BGR图像转换为RGB格式
-            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-
-            rgb_select_normalized = np.array(rgb_select)
-            mask = np.all(np.abs(img_rgb - rgb_select_normalized) <= tolerance, axis=-1)
-
-            # 使用掩码将匹配的像素保留，其他像素设置为255
-            result_img = img_rgb.copy()
-            result_img[mask] = 0
-            result_img[~mask] = 255
-
-            # 将处理后的图像转换回BGR格式
-            result_img_bgr = cv2.cvtColor(result_img, cv2.COLOR_RGB2BGR)
-
-            return result_img_bgr
-
-        def post_process_text(t):
-            for k, v in self.WORD_REPLACE.items():
-                t = t.replace(k, v)
-            if candidates:
-                t = process.extractOne(t, candidates)[0]
-            return t
+        """识别任意字符串
+
+        Args:
+            preprocess (list, optional): 识别前的预处理步骤, 例如 ["binarize", ("upscale", 2)].
+                返回的坐标仍为相对原图的坐标
+        """
+        return self.recognize_batch(
+            [img],
+            allowlist,
+            candidates,
+            multiple,
+            allow_nan,
+            rgb_select,
+            tolerance,
+            preprocess,
+            **kwargs,
+        )[0]
 
-        img = pre_process_rgb(img, rgb_select, tolerance)
-        results = self.read_text(img, allowlist, **kwargs)
-        results = [(t[0], post_process_text(t[1]), t[2]) for t in results]
+    def recognize_batch(
+        self,
+        imgs,
+        allowlist: List[str] = None,
+        candidates: List[str] = None,
+        multiple=False,
+        allow_nan=False,
+        rgb_select=None,
+        tolerance=30,
+        preprocess=None,
+        **kwargs,
+    ):
+        """一次识别多张图片中的任意字符串, 参数与 recognize 相同
+
+        Returns:
+            list: 与 imgs 一一对应的 recognize 结果
+        """
+        prepared = [
+            self.preprocess(img, rgb_select, tolerance, preprocess) for img in imgs
+        ]
+        imgs = [img for img, _ in prepared]
+        scales = [scale for _, scale in prepared]
+        # 候选词列表的哈希在建立索引时计算一次, 不在每次查询时复制整个列表
+        candidates_key = candidates and self.candidate_index(candidates).key
+        keys = [
+            self.cache.make_key(
+                img,
+                type(self).__name__,
+                allowlist,
+                candidates_key,
+                rgb_select,
+                tolerance,
+                preprocess,
+                sorted(kwargs.items()),
+            )
+            for img in imgs
+        ]
+        all_results = [self.cache.get(key) for key in keys]
+        missing = [i for i, results in enumerate(all_results) if results is None]
+        if missing:
+            texts = self.read_text_batch(
+                [imgs[i] for i in missing], allowlist, **kwargs
+            )
+            for i, results in zip(missing, texts):
+                results = [
+                    (
+                        scale_position(t[0], scales[i]),
+                        self.post_process_text(t[1], candidates),
+                        t[2],
+                    )
+                    for t in results
+                ]
+                self.cache.put(keys[i], results)
+                all_results[i] = results
+        return [
+            self._select_text(results, multiple, allow_nan) for results in all_results
+        ]
+
+    def _select_text(self, results, multiple=False, allow_nan=False):
         if self.config.SHOW_OCR_INFO:
             self.logger.debug(f"修正OCR结果：{results}")
 
@@ -80,38 +442,101 @@ class OCRBackend:
                 results = ["Unkown"]
             return results[0]
 
+    @classmethod
+    def process_number(cls, t: str):
+        # 今日胖次、掉落; 决战升级经验等
+        if "/" in t:
+            nums = t.split("/")
+            assert len(nums) == 2
+            return cls.process_number(nums[0]), cls.process_number(nums[1])
+
+        # 决战，费用是f"x{cost}"格式
+        t = t.lstrip("xX")
+        # 战后经验值 f"Lv.{exp}"格式
+        t = t.lstrip("Lv.")
+        # 建造资源有前导0
+        if t != "0":
+            t = t.lstrip("0")
+
+        # 资源可以是K/M结尾
+        if t.endswith("K") or t.endswith("k"):
+            return eval(t[:-1]) * 1000
+        if t.endswith("M"):
+            return eval(t[:-1]) * 1000000
+
+        return eval(t)
+
     def recognize_number(
         self, img, extra_chars="", multiple=False, allow_nan=False, **kwargs
     ):
-        """识别数字"""
-
-        def process_number(t: str):
-            # 今日胖次、掉落; 决战升级经验等
-            if "/" in t:
-                nums = t.split("/")
-                assert len(nums) == 2
-                return process_number(nums[0]), process_number(nums[1])
-
-            # 决战，费用是f"x{cost}"格式
-            t = t.lstrip("xX")
-            # 战后经验值 f"Lv.{exp}"格式
-            t = t.lstrip("Lv.")
-            # 建造资源有前导0
-            if t != "0":
-                t = t.lstrip("0")
-
-            # 资源可以是K/M结尾
-            if t.endswith("K") or t.endswith("k"):
-                return eval(t[:-1]) * 1000
-            if t.endswith("M"):
-                return eval(t[:-1]) * 1000000
-
-            return eval(t)
-
-        results = self.recognize(
-            img, allowlist="0123456789" + extra_chars, multiple=True, **kwargs
-        )
-        results = [(t[0], process_number(t[1]), t[2]) for t in results]
+        """识别数字
+
+        可以通过 number_backend 参数 ("ocr" 或 "template") 指定本次使用的识别方式,
+        默认使用 config.NUMBER_OCR_BACKEND
+        """
+        results = self._read_numbers([img], extra_chars, **kwargs)[0]
+        return self._select_number(results, multiple, allow_nan)
+
+    def recognize_number_batch(
+        self, imgs, extra_chars="", multiple=False, allow_nan=False, **kwargs
+    ):
+        """一次识别多张图片中的数字, 参数与 recognize_number 相同
+
+        Returns:
+            list: 与 imgs 一一对应的 recognize_number 结果, 识别或解析失败时对应项为 None
+        """
+        try:
+            all_results = self._read_numbers(imgs, extra_chars, **kwargs)
+        except Exception as e:
+            self.logger.error(f"OCR识别数字失败: {e}")
+            return [None] * len(imgs)
+        numbers = []
+        for results in all_results:
+            try:
+                numbers.append(self._select_number(results, multiple, allow_nan))
+            except Exception as e:
+                self.logger.error(f"OCR识别数字失败: {results}, {e}")
+                numbers.append(None)
+        return numbers
+
+    def _read_numbers(self, imgs, extra_chars="", number_backend=None, **kwargs):
+        """识别数字的原始文本, 字形模板无法识别的图片交给 OCR 模型并用其结果学习字形"""
+        allowlist = "0123456789" + extra_chars
+        number_backend = number_backend or self.config.NUMBER_OCR_BACKEND
+        if number_backend == "ocr":
+            return self.recognize_batch(
+                imgs, allowlist=allowlist, multiple=True, **kwargs
+            )
+        if number_backend != "template":
+            raise ValueError(f"Unknown NUMBER_OCR_BACKEND: {number_backend}")
+
+        prepared = [
+            self.preprocess(
+                img,
+                kwargs.get("rgb_select"),
+                kwargs.get("tolerance", 30),
+                kwargs.get("preprocess"),
+            )
+            for img in imgs
+        ]
+        all_results = []
+        for img, scale in prepared:
+            results = self.digit_recognizer.read_text(img, allowlist)
+            if results is not None:
+                results = [(scale_position(t[0], scale), t[1], t[2]) for t in results]
+            all_results.append(results)
+        missing = [i for i, results in enumerate(all_results) if results is None]
+        if missing:
+            fallback = self.recognize_batch(
+                [imgs[i] for i in missing], allowlist=allowlist, multiple=True, **kwargs
+            )
+            for i, results in zip(missing, fallback):
+                self.digit_recognizer.learn(prepared[i][0], results)
+                all_results[i] = results
+        return all_results
+
+    def _select_number(self, results, multiple=False, allow_nan=False):
+        results = [(t[0], self.process_number(t[1]), t[2]) for t in results]
         if self.config.SHOW_OCR_INFO:
             self.logger.debug(f"数字解析结果：{results}")
 
@@ -129,19 +554,9 @@ class OCRBackend:
     def recognize_ship(self, image, candidates, **kwargs):
         """传入一张图片,返回舰船信息,包括名字和舰船型号"""
         if isinstance(image, str):
-            image_path = os.path.abspath(image)
-        else:
-            image_path = os.path.join(TUNNEL_ROOT, "OCR.PNG")
-            cv2.imwrite(image_path, image)
-        with open(os.path.join(TUNNEL_ROOT, "locator.in"), "w+") as f:
-            f.write(image_path)
-        locator_exe = os.path.join(TUNNEL_ROOT, "locator.exe")
-        subprocess.run([locator_exe, TUNNEL_ROOT])
-        if os.path.exists(os.path.join(TUNNEL_ROOT, "1.PNG")):
-            img_path = os.path.join(TUNNEL_ROOT, "1.PNG")
-        else:
-            img_path = "1.PNG"
-        return self.recognize(img_path, candidates=candidates, multiple=True, **kwargs)
+            image = cv2.imread(image)
+        image, _ = locate_text_boxes(image)
+        return self.recognize(image, candidates=candidates, multiple=True, **kwargs)
 
     # def recognize_time(self, img, format="%H:%M:%S"):
     #     """识别时间"""
@@ -155,11 +570,23 @@ class EasyocrBackend(OCRBackend):
         "鲴鱼": "鲃鱼",
     }
 
-    def __init__(self, config, logger) -> None:
-        super().__init__(config, logger)
+    def load_model(self):
         import easyocr
+        import torch
 
-        self.reader = easyocr.Reader(["ch_sim", "en"])
+        profile = self.config.OCR_PROFILE
+        if profile["threads"]:
+            torch.set_num_threads(profile["threads"])
+        use_gpu = profile["device"] == "gpu" or (
+            profile["device"] == "auto" and torch.cuda.is_available()
+        )
+        self.logger.debug(f"easyocr device: {'gpu' if use_gpu else 'cpu'}")
+        return easyocr.Reader(
+            ["ch_sim", "en"],
+            gpu=use_gpu,
+            quantize=profile["quantize"],
+            verbose=self.config.SHOW_OCR_INFO,
+        )
 
     def read_text(
         self,
@@ -206,16 +633,30 @@ class PaddleOCRBackend(OCRBackend):
         "鲍鱼": "鲃鱼",
     }
 
-    def __init__(self, config, logger) -> None:
-        super().__init__(config, logger)
+    def load_model(self):
         # TODO:后期单独训练模型，提高识别准确率，暂时使用现成的模型
+        import paddle
         from paddleocr import PaddleOCR
 
-        self.reader = PaddleOCR(
-            use_angle_cls=True,
-            use_gpu=True,
-            show_log=True,
+        profile = self.config.OCR_PROFILE
+        options = {}
+        if profile["threads"]:
+            options["cpu_threads"] = profile["threads"]
+        # auto 先确定实际使用的设备, 只有 CPU 版本的 paddle 会忽略 use_gpu 而在 CPU 上运行
+        use_gpu = profile["device"] == "gpu" or (
+            profile["device"] == "auto"
+            and paddle.device.is_compiled_with_cuda()
+            and paddle.device.cuda.device_count() > 0
+        )
+        self.logger.debug(f"paddleocr device: {'gpu' if use_gpu else 'cpu'}")
+        return PaddleOCR(
+            use_angle_cls=profile["angle_cls"],
+            use_gpu=use_gpu,
+            # paddleocr 没有自带量化权重, 在 CPU 上用 MKLDNN 加速代替
+            enable_mkldnn=profile["quantize"] and not use_gpu,
+            show_log=self.config.SHOW_OCR_INFO,
             lang="ch",
+            **options,
         )  # need to run only once to download and load model into memory
 
     def read_text(self, img, allowlist, **kwargs):
@@ -225,7 +666,9 @@ class PaddleOCRBackend(OCRBackend):
             x2, y2 = pos2
             return (x1 + x2) / 2, (y1 + y2) / 2
 
-        results = self.reader.ocr(img, cls=False, **kwargs)
+        results = self.reader.ocr(
+            img, cls=self.config.OCR_PROFILE["angle_cls"], **kwargs
+        )
         if results == [None]:
             results = []
         else:
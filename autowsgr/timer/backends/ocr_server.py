@@ -0,0 +1,285 @@
+"""多个 Timer 共用的 OCR 服务
+
+同一台机器上多开模拟器时, 每个 Timer 各自加载一份 OCR 模型会占用大量内存.
+OCR 服务在单独的进程中只加载一份模型, 各个 Timer 通过 RemoteOCRBackend 连接,
+服务端把短时间内到达的请求合并为一批识别.
+
+启动服务:
+    python -m autowsgr.timer.backends.ocr_server [user_settings.yaml]
+服务使用设置中的 OCR_SERVER_BACKEND 和 OCR_PROFILE 加载模型, 监听 OCR_SERVER 地址.
+客户端的设置中令 OCR_BACKEND: remote 即可.
+
+服务端和客户端之间用 pickle 传输数据, 能通过密钥验证的进程就能在服务进程中执行任意代码.
+OCR_SERVER_AUTHKEY 留空时, 服务启动时生成随机密钥保存在 KEY_PATH, 同一用户的客户端读取该文件,
+此时服务只能监听本机地址. 监听其他地址时必须在两端设置相同的 OCR_SERVER_AUTHKEY.
+"""
+
+import ipaddress
+import os
+import queue
+import secrets
+import sys
+import threading as th
+import time
+from multiprocessing.connection import Client, Connection, Listener
+from types import SimpleNamespace
+from typing import List
+
+from autowsgr.constants.data_roots import USER_DATA_ROOT
+from autowsgr.timer.backends.ocr_backend import (
+    EasyocrBackend,
+    OCRBackend,
+    PaddleOCRBackend,
+)
+
+MAX_BATCH = 16  # 一批最多合并的图片数
+BATCH_WINDOW = 0.01  # 收到请求后等待更多请求的时间
+KEY_PATH = os.path.join(USER_DATA_ROOT, "ocr_server.key")  # 自动生成的密钥
+WEAK_AUTHKEYS = {"autowsgr"}  # 曾经作为默认值公开的密钥, 不能使用
+
+
+def parse_address(address: str):
+    """解析服务地址, "host:port" 为 TCP 地址, 否则视为 Unix socket 路径或 Windows 命名管道"""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return host, int(port)
+    return address
+
+
+def is_loopback(address):
+    """是否为只能从本机连接的地址, Unix socket 和 Windows 命名管道视为本机地址"""
+    if not isinstance(address, tuple):
+        return True
+    host = address[0]
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def get_authkey(config, create=False) -> bytes:
+    """读取 OCR 服务的密钥
+
+    Args:
+        create (bool, optional): OCR_SERVER_AUTHKEY 留空并且 KEY_PATH 不存在时是否生成新的密钥.
+            服务端为 True, 客户端为 False. Defaults to False.
+
+    Raises:
+        ValueError: 使用了公开的默认密钥, 或自动生成的密钥用于非本机地址
+        FileNotFoundError: 客户端找不到自动生成的密钥, 服务可能尚未启动
+    """
+    if config.OCR_SERVER_AUTHKEY:
+        if config.OCR_SERVER_AUTHKEY in WEAK_AUTHKEYS:
+            raise ValueError(
+                f"OCR_SERVER_AUTHKEY 不能使用公开的默认值 '{config.OCR_SERVER_AUTHKEY}', "
+                "请留空使用自动生成的密钥, 或设置为随机字符串"
+            )
+        return config.OCR_SERVER_AUTHKEY.encode()
+
+    if not is_loopback(parse_address(config.OCR_SERVER)):
+        raise ValueError(
+            f"OCR 服务地址 {config.OCR_SERVER} 不是本机地址, 必须设置 OCR_SERVER_AUTHKEY"
+        )
+    if not os.path.exists(KEY_PATH):
+        if not create:
+            raise FileNotFoundError(f"找不到 OCR 服务的密钥文件 {KEY_PATH}")
+        os.makedirs(os.path.dirname(KEY_PATH), exist_ok=True)
+        fd = os.open(KEY_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+    with open(KEY_PATH) as f:
+        return f.read().strip().encode()
+
+
+class OCRServer:
+    """OCR 服务端, 持有一个 OCRBackend 并为多个客户端识别"""
+
+    def __init__(self, backend: OCRBackend, address, authkey: bytes, logger) -> None:
+        self.backend = backend
+        self.logger = logger
+        self.listener = Listener(parse_address(address), authkey=authkey)
+        self.address = self.listener.address
+        self._requests = queue.Queue()
+        self._running = False
+
+    def serve_forever(self):
+        self._running = True
+        self.backend.reader  # 启动时加载模型
+        th.Thread(target=self._batch_loop, name="ocr_batch", daemon=True).start()
+        self.logger.info(f"OCR server listening on {self.address}")
+        while self._running:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                break
+            except Exception as e:
+                self.logger.warning(f"OCR server rejected a connection: {e}")
+                continue
+            th.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def close(self):
+        self._running = False
+        self.listener.close()
+
+    # ======== 客户端连接 ========
+    def _handle(self, conn: Connection):
+        lock = th.Lock()
+        with lock:
+            conn.send(
+                {
+                    "backend": type(self.backend).__name__,
+                    "word_replace": self.backend.WORD_REPLACE,
+                }
+            )
+        try:
+            while True:
+                request_id, imgs, allowlist, kwargs = conn.recv()
+                self._requests.put((conn, lock, request_id, imgs, allowlist, kwargs))
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    # ======== 合批识别 ========
+    def _batch_loop(self):
+        while True:
+            requests = [self._requests.get()]
+            count = len(requests[0][3])
+            deadline = time.time() + BATCH_WINDOW
+            while count < MAX_BATCH:
+                try:
+                    request = self._requests.get(timeout=max(deadline - time.time(), 0))
+                except queue.Empty:
+                    break
+                requests.append(request)
+                count += len(request[3])
+
+            # 参数相同的请求才能合并
+            groups = {}
+            for request in requests:
+                key = repr((request[4], sorted(request[5].items())))
+                groups.setdefault(key, []).append(request)
+            for group in groups.values():
+                self._run_group(group)
+
+    def _run_group(self, group):
+        imgs = [img for request in group for img in request[3]]
+        allowlist, kwargs = group[0][4], group[0][5]
+        try:
+            results = self.backend.read_text_batch(imgs, allowlist, **kwargs)
+            error = None
+        except Exception as e:
+            self.logger.error(f"OCR server failed: {e}")
+            results, error = [None] * len(imgs), repr(e)
+
+        pos = 0
+        for conn, lock, request_id, request_imgs, _, _ in group:
+            part = results[pos : pos + len(request_imgs)]
+            pos += len(request_imgs)
+            try:
+                with lock:
+                    conn.send((request_id, part, error))
+            except (OSError, EOFError):
+                pass
+
+
+class RemoteOCRBackend(OCRBackend):
+    """连接 OCRServer 的客户端, 识别结果与服务端的 OCRBackend 相同"""
+
+    WORD_REPLACE = {}
+
+    def __init__(self, config, logger):
+        super().__init__(config, logger)
+        self._lock = th.Lock()
+        self._request_id = 0
+
+    def load_model(self):
+        address = parse_address(self.config.OCR_SERVER)
+        deadline = time.time() + self.config.OCR_SERVER_TIMEOUT
+        while True:
+            try:
+                # 密钥文件由服务启动时生成, 每次重试都重新读取
+                conn = Client(address, authkey=get_authkey(self.config))
+                break
+            except (OSError, EOFError):
+                if time.time() > deadline:
+                    raise ConnectionError(
+                        f"无法连接 OCR 服务: {self.config.OCR_SERVER}"
+                    )
+                time.sleep(1)
+        hello = conn.recv()
+        self.WORD_REPLACE = hello["word_replace"]
+        self.logger.info(
+            f"已连接 OCR 服务 {self.config.OCR_SERVER} ({hello['backend']})"
+        )
+        return conn
+
+    def read_text(self, img, allowlist: List[str] = None, **kwargs):
+        return self.read_text_batch([img], allowlist, **kwargs)[0]
+
+    def read_text_batch(self, imgs, allowlist: List[str] = None, **kwargs):
+        try:
+            results, error = self._request(imgs, allowlist, kwargs)
+        except (EOFError, OSError) as e:
+            # 服务重启后原来的连接失效, 重新连接一次
+            self.logger.warning(f"OCR 服务连接断开, 重新连接: {e}")
+            results, error = self._request(imgs, allowlist, kwargs)
+        if error is not None:
+            raise RuntimeError(f"OCR 服务识别失败: {error}")
+        if self.config.SHOW_OCR_INFO:
+            self.logger.debug(f"原始OCR结果: {results}")
+        return results
+
+    def _request(self, imgs, allowlist, kwargs):
+        conn = self.reader
+        try:
+            with self._lock:
+                self._request_id += 1
+                conn.send((self._request_id, list(imgs), allowlist, kwargs))
+                request_id, results, error = conn.recv()
+            return results, error
+        except (EOFError, OSError):
+            self._drop_connection(conn)
+            raise
+
+    def _drop_connection(self, conn: Connection):
+        """关闭失效的连接, 下一次访问 reader 时重新连接"""
+        with self._load_lock:
+            if self._reader is conn:
+                self._reader = None
+                self._ready.clear()
+        conn.close()
+
+
+def main(settings_path=None):
+    import logging
+
+    from autowsgr.constants.data_roots import DATA_ROOT
+    from autowsgr.utils.io import recursive_dict_update, yaml_to_dict
+
+    config = yaml_to_dict(os.path.join(DATA_ROOT, "default_settings.yaml"))
+    if settings_path is not None:
+        config = recursive_dict_update(config, yaml_to_dict(settings_path))
+    config = SimpleNamespace(**config)
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("ocr_server")
+
+    if config.OCR_SERVER_BACKEND == "easyocr":
+        backend = EasyocrBackend(config, logger)
+    elif config.OCR_SERVER_BACKEND == "paddleocr":
+        backend = PaddleOCRBackend(config, logger)
+    else:
+        raise ValueError(f"Unknown OCR_SERVER_BACKEND: {config.OCR_SERVER_BACKEND}")
+    server = OCRServer(
+        backend, config.OCR_SERVER, get_authkey(config, create=True), logger
+    )
+    try:
+        server.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
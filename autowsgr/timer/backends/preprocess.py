@@ -0,0 +1,90 @@
+"""OCR 前的图像预处理
+
+预处理流程由若干步骤组成, 每一步为步骤名或 (步骤名, 参数...) 元组, 在调用处声明, 例如:
+    timer.recognize(img, preprocess=[("select_color", (247, 221, 82), 50), ("upscale", 2)])
+
+所有步骤都直接处理 BGR 图像, 中间结果使用线程内复用的缓冲区, 只有最终结果会分配新的数组.
+"""
+
+import threading as th
+from typing import Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+
+Step = Union[str, Tuple]
+
+_local = th.local()
+
+
+def _buffer(name, shape):
+    """返回当前线程中名为 name 的 uint8 缓冲区, 尺寸变化时重新分配"""
+    buffers = getattr(_local, "buffers", None)
+    if buffers is None:
+        buffers = _local.buffers = {}
+    buffer = buffers.get(name)
+    if buffer is None or buffer.shape != shape:
+        buffer = buffers[name] = np.empty(shape, dtype=np.uint8)
+    return buffer
+
+
+def _gray(img):
+    if img.ndim == 2:
+        return img
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=_buffer("gray", img.shape[:2]))
+
+
+def select_color(img, rgb, tolerance=30):
+    """与 rgb 每个通道相差都不超过 tolerance 的像素变为黑色, 其余变为白色"""
+    bgr = np.array(rgb[::-1], dtype=np.int32)
+    lower = np.clip(bgr - tolerance, 0, 255).astype(np.float64)
+    upper = np.clip(bgr + tolerance, 0, 255).astype(np.float64)
+    mask = _buffer("mask", img.shape[:2])
+    cv2.inRange(img, lower, upper, dst=mask)
+    cv2.bitwise_not(mask, dst=mask)
+    return cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR)
+
+
+def binarize(img, threshold=None):
+    """二值化, threshold 为 None 时使用 Otsu 自动阈值"""
+    mask = _buffer("mask", img.shape[:2])
+    if threshold is None:
+        cv2.threshold(_gray(img), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, mask)
+    else:
+        cv2.threshold(_gray(img), threshold, 255, cv2.THRESH_BINARY, mask)
+    return cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR)
+
+
+def invert(img):
+    return cv2.bitwise_not(img)
+
+
+def upscale(img, scale=2):
+    return cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+
+
+STEPS = {
+    "select_color": select_color,
+    "binarize": binarize,
+    "invert": invert,
+    "upscale": upscale,
+}
+
+
+def run_pipeline(img, steps: Sequence[Step]):
+    """依次执行预处理步骤
+
+    Returns:
+        Tuple[np.ndarray, float]: (处理后的图像, 相对原图的缩放倍数)
+    """
+    scale = 1
+    if not isinstance(img, np.ndarray):
+        return img, scale
+    for step in steps:
+        name, *args = (step,) if isinstance(step, str) else step
+        if name not in STEPS:
+            raise ValueError(f"Unknown preprocess step: {name}")
+        img = STEPS[name](img, *args)
+        if name == "upscale":
+            scale *= args[0] if args else 2
+    return img, scale
@@ -0,0 +1,124 @@
+import os
+import sys
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+CONTROLLERS_ROOT = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_PARENT = os.path.dirname(os.path.dirname(os.path.dirname(CONTROLLERS_ROOT)))
+
+SAMPLE_SCALE = 1 / 8  # 比较画面时缩小的比例
+SAMPLE_GAP = 0.05  # 测量时的截图间隔
+DIFF_THRESHOLD = 2.0  # 缩小后的灰度图平均差值超过该值视为画面在变化
+MIN_SAMPLES = 3  # 每个位置测量这么多次后才开始缩短延时
+WINDOW = 20  # 每个位置保留最近的测量次数
+RESAMPLE_EVERY = 10  # 开始缩短延时后每这么多次重新测量一次, 跟上模拟器速度的变化
+MARGIN = 0.05  # 在测量得到的稳定时间上额外等待的时间
+MIN_DELAY = 0.05  # 小于该值的延时不做调整
+CALLER_DEPTH = 2  # 标识中包含的调用层数, 使通用函数在不同调用处的延时分开统计
+
+
+def _site(frame):
+    path = os.path.abspath(frame.f_code.co_filename)
+    if path.startswith(PACKAGE_PARENT + os.sep):
+        path = os.path.relpath(path, PACKAGE_PARENT)
+    return f"{path.replace(os.sep, '/')}:{frame.f_lineno}"
+
+
+def caller_site():
+    """返回控制器之外的调用栈位置作为延时的标识
+
+    格式为 "autowsgr/路径.py:行号 < 上一层调用处", 包含 CALLER_DEPTH 层.
+    同一行代码用于不同的界面切换 (如 Timer.operate) 时调用方应显式指定标识
+    """
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_filename.startswith(CONTROLLERS_ROOT):
+        frame = frame.f_back
+    sites = []
+    while frame is not None and len(sites) < CALLER_DEPTH:
+        sites.append(_site(frame))
+        frame = frame.f_back
+    return " < ".join(sites) or "unknown"
+
+
+class AdaptiveDelay:
+    """根据画面实际稳定所需的时间缩短操作后的固定延时
+
+    同一个位置 (调用处或指定的标识) 的前几次操作照常等待完整的延时, 同时持续截图,
+    记录最后一次画面变化的时间作为稳定时间. 之后只等待最近若干次稳定时间的百分位数,
+    原来的延时作为上限.
+    """
+
+    def __init__(self, capture_backend, logger, enabled=False, percentile=90) -> None:
+        """
+        Args:
+            enabled (bool, optional): 为 False 时总是等待完整的延时. Defaults to False.
+            percentile (int, optional): 使用稳定时间的百分位数. Defaults to 90.
+        """
+        self.capture_backend = capture_backend
+        self.logger = logger
+        self.enabled = enabled
+        self.percentile = percentile
+        self.samples = {}  # 标识 -> 最近的稳定时间
+        self.calls = {}  # 标识 -> 调用次数
+        self.saved = 0  # 累计节省的时间
+
+    def get_delay(self, key, ceiling):
+        """返回标识 key 当前使用的延时, 测量次数不足时返回 None"""
+        samples = self.samples.get(key)
+        if samples is None or len(samples) < MIN_SAMPLES:
+            return None
+        return min(float(np.percentile(samples, self.percentile)) + MARGIN, ceiling)
+
+    def wait(self, key, ceiling):
+        """等待画面稳定, 最多等待 ceiling 秒
+
+        Returns:
+            Tuple[int, np.ndarray] | None: 测量时截取的最后一帧 (帧序号, 图像), 没有测量时为 None
+        """
+        if not self.enabled or ceiling < MIN_DELAY:
+            time.sleep(ceiling)
+            return None
+        self.calls[key] = self.calls.get(key, 0) + 1
+        delay = self.get_delay(key, ceiling)
+        if delay is None or self.calls[key] % RESAMPLE_EVERY == 0:
+            settle_time, frame = self.measure(ceiling)
+            self.samples.setdefault(key, deque(maxlen=WINDOW)).append(settle_time)
+            return frame
+        time.sleep(delay)
+        self.saved += ceiling - delay
+        return None
+
+    def measure(self, duration):
+        """在 duration 秒内持续截图, 返回 (最后一次画面变化距开始的时间, 最后一帧)"""
+        start_time = time.time()
+        deadline = start_time + duration
+        frame_id, frame = self.capture_backend.latest_frame()
+        last = self._small(frame)
+        settle_time = 0
+        while True:
+            remain = deadline - time.time()
+            if remain <= 0:
+                break
+            self.capture_backend.wait_frame(frame_id, remain, SAMPLE_GAP)
+            if time.time() > deadline:
+                break
+            frame_id, frame = self.capture_backend.latest_frame()
+            small = self._small(frame)
+            if cv2.absdiff(small, last).mean() > DIFF_THRESHOLD:
+                settle_time = time.time() - start_time
+            last = small
+        return min(settle_time, duration), (frame_id, frame)
+
+    @staticmethod
+    def _small(frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(
+            gray,
+            None,
+            fx=SAMPLE_SCALE,
+            fy=SAMPLE_SCALE,
+            interpolation=cv2.INTER_AREA,
+        )
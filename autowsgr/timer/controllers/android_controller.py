@@ -1,22 +1,46 @@
-import copy
+import atexit
 import datetime
 import os
-import threading as th
 import time
+import zlib
 from typing import Iterable, Tuple
 
 import cv2
+import numpy as np
 from airtest.core.android import Android
+from airtest.core.cv import TargetPos
+from airtest.core.error import AdbShellError
+from PIL import Image as PIM
 
 from autowsgr.constants.custom_exceptions import ImageNotFoundErr
+from autowsgr.constants.image_templates import (
+    IMG,
+    SCREEN_METHODS,
+    PreparedScreen,
+    dump_template_roi,
+    preload_templates,
+    set_roi_recording,
+)
+from autowsgr.timer.backends import (
+    PersistentShell,
+    SnapshotCaptureBackend,
+    StreamCaptureBackend,
+)
+from autowsgr.timer.controllers.adaptive_delay import AdaptiveDelay, caller_site
+from autowsgr.timer.controllers.gesture_script import GestureScript
+from autowsgr.timer.controllers.input_dispatcher import InputDispatcher
 from autowsgr.utils.api_image import (
     MyTemplate,
     absolute_to_relative,
+    first_match_index,
     locateCenterOnImage,
+    match_many,
     relative_to_absolute,
 )
 from autowsgr.utils.logger import Logger
-from autowsgr.utils.math_functions import CalcDis
+from autowsgr.utils.math_functions import nearest_colors
+
+GESTURE_TIMEOUT_MARGIN = 10  # GestureScript 的超时时间为预计执行时间加上该值
 
 
 class AndroidController:
@@ -25,30 +49,90 @@ class AndroidController:
     用于提供底层的控制接口
     """
 
-    def __init__(self, config, logger: Logger, dev: Android) -> None:
+    def __init__(self, config, logger: Logger, dev: Android, start_time=None) -> None:
         self.config = config
         self.logger = logger
         self.dev = dev
+        self.start_time = start_time or time.time()  # 用于统计启动到第一次点击的时间
+        self.first_click_time = None
+        self.persistent_shell = None
+        if self.config.ADB_PERSISTENT_SHELL:
+            self.persistent_shell = PersistentShell(
+                dev.serialno, logger, (dev.adb.host, dev.adb.port)
+            )
+        self.input_count = 0  # 已经发出的输入操作数, 用于判断截图是否在某次输入之后
+        self.input_dispatcher = InputDispatcher(
+            self._input,
+            logger,
+            max_pending=self.config.INPUT_QUEUE_SIZE,
+            max_rate=self.config.INPUT_MAX_RATE,
+        )
+
+        if self.config.CAPTURE_BACKEND == "snapshot":
+            self.capture_backend = SnapshotCaptureBackend(config, logger, dev)
+        elif self.config.CAPTURE_BACKEND == "stream":
+            self.capture_backend = StreamCaptureBackend(
+                config, logger, dev, address=self.config.CAPTURE_STREAM or None
+            )
+        else:
+            raise ValueError(f"Unknown CAPTURE_BACKEND: {self.config.CAPTURE_BACKEND}")
+        self.capture_backend.start()
+        self.adaptive_delay = AdaptiveDelay(
+            self.capture_backend,
+            logger,
+            enabled=self.config.ADAPTIVE_DELAY,
+            percentile=self.config.ADAPTIVE_DELAY_PERCENTILE,
+        )
+
+        self.frame_id = 0  # 当前 self.screen 的帧序号
+        self.screen_hash = None  # 当前 self.screen 的内容哈希, 用于判断画面是否变化
+        self._prepared_screen = None
+        self._views_source = None  # 派生视图对应的截图
+        self._views = {}  # 当前截图的派生视图, 参考 get_screen_view
         self.update_screen()
         self.resolution = self.screen.shape[:2]
         self.resolution = self.resolution[::-1]
         self.logger.info(f"resolution:{self.resolution}")
+        preload_templates(IMG, self.resolution)
+        if self.config.RECORD_TEMPLATE_ROI:
+            set_roi_recording(True)
+            atexit.register(dump_template_roi, IMG)
 
     # ========= 基础命令 =========
-    def shell(self, cmd, *args, **kwargs):
+    def shell(self, cmd, timeout=None, *args, **kwargs):
         """向链接的模拟器发送 shell 命令
+
+        开启 ADB_PERSISTENT_SHELL 时通过长连接 shell 发送, 长连接不可用时退回 airtest 的单次 shell
         Args:
             cmd (str):命令字符串
+            timeout (float, optional): 长连接 shell 的超时时间, 用于执行时间较长的命令
         """
+        shell = self.persistent_shell
+        if shell is not None and shell.available() and "\n" not in cmd:
+            try:
+                output, code = shell.run(cmd, timeout)
+            except (OSError, EOFError) as e:
+                self.logger.warning(f"长连接 shell 不可用, 改用单次 shell: {e}")
+            else:
+                # 与 airtest 一致, 返回值不为 0 时抛出异常
+                if code != 0:
+                    raise AdbShellError(output, "")
+                return output
         return self.dev.shell(cmd)
 
+    def _input(self, cmd, **kwargs):
+        """执行一条输入命令, 由 input_dispatcher 在分发线程中调用"""
+        ret = self.shell(cmd, **kwargs)
+        self.input_count += 1
+        return ret
+
     def get_frontend_app(self):
         """获取前台应用的包名"""
         return self.shell("dumpsys window | grep mCurrentFocus")
 
     def start_background_app(self, package_name):
         self.dev.start_app(package_name)
-        self.shell("input keyevent 3")
+        self.key_event(3)
 
     def start_app(self, package_name):
         self.dev.start_app(package_name)
@@ -58,7 +142,7 @@ class AndroidController:
 
     def list_apps(self):
         """列出所有正在运行的应用"""
-        return self.dev.shell("ps")
+        return self.shell("ps")
 
     def is_game_running(self, app="zhanjian2"):
         """检查一个应用是否在运行
@@ -72,25 +156,45 @@ class AndroidController:
         return app in self.list_apps()
 
     # ========= 输入控制信号 =========
+    def key_event(self, code, delay=0):
+        """按键, 与点击一样经过输入队列, 如 3 为 HOME 键
+
+        Args:
+            code (int | str): 按键码
+            delay (float, optional): 按键后延时(单位为秒). Defaults to 0.
+        """
+        cmd = f"input keyevent {code}"
+        if self.config.SHOW_ANDROID_INPUT:
+            self.logger.debug(cmd)
+        self.input_dispatcher.submit(cmd).result()
+        if delay > 0:
+            self.settle(delay)
+
     def text(self, t):
         """输入文本
 
         需要焦点在输入框时才能输入
         """
         self.logger.debug(f"Typing:{t}")
+        # 等待之前的点击执行完, 保证焦点已经在输入框上
+        self.input_dispatcher.wait_idle()
         self.dev.text(t)
 
-    def relative_click(self, x, y, times=1, delay=0.5, enable_subprocess=False):
+    def relative_click(
+        self, x, y, times=1, delay=0.5, enable_subprocess=False, key=None
+    ):
         """点击模拟器相对坐标 (x,y).
         Args:
             x,y:相对坐标
             delay:点击后延时(单位为秒)
-            enable_subprocess:是否启用多线程加速
+            enable_subprocess:是否异步点击, 为 True 时提交到输入队列后立即返回,
+                队列中尚未执行的相同点击会被合并 (用于反复点击跳过动画)
+            key:点击后延时的标识, 参考 settle
             Note:
                 if 'enable_subprocess' is True,arg 'times' must be 1
         Returns:
             enable_subprocess == False:None
-            enable_subprocess == True:A class threading.Thread refers to this click subprocess
+            enable_subprocess == True:A concurrent.futures.Future refers to this click
         """
         if self.config.SHOW_ANDROID_INPUT:
             self.logger.debug(f"click ({x:.3f} {y:.3f})")
@@ -104,36 +208,54 @@ class AndroidController:
             raise ValueError(
                 "subprocess enabled but arg 'times' is not 1 but " + str(times)
             )
+        if self.first_click_time is None:
+            self.first_click_time = time.time()
+            self.logger.info(
+                f"time to first click: {self.first_click_time - self.start_time:.2f}s"
+            )
+        cmd = f"input tap {str(x)} {str(y)}"
         if enable_subprocess:
-            p = th.Thread(target=lambda: self.shell(f"input tap {str(x)} {str(y)}"))
-            p.start()
-            return p
+            return self.input_dispatcher.submit(cmd, coalesce=True)
 
         for _ in range(times):
-            self.shell(f"input tap {str(x)} {str(y)}")
-            time.sleep(delay * self.config.DELAY)
+            self.input_dispatcher.submit(cmd).result()
+            self.settle(delay * self.config.DELAY, key)
 
-    def click(self, x, y, times=1, delay=0.1, enable_subprocess=False, *args, **kwargs):
+    def click(
+        self,
+        x,
+        y,
+        times=1,
+        delay=0.1,
+        enable_subprocess=False,
+        *args,
+        key=None,
+        **kwargs,
+    ):
         """点击模拟器相对坐标 (x,y).
         Args:
             x,y:相对横坐标  (相对 960x540 屏幕)
             delay:点击后延时(单位为秒)
-            enable_subprocess:是否启用多线程加速
+            enable_subprocess:是否异步点击, 参考 relative_click
+            key:点击后延时的标识, 参考 settle
             Note:
                 if 'enable_subprocess' is True,arg 'times' must be 1
         Returns:
             enable_subprocess == False:None
-            enable_subprocess == True:A class threading.Thread refers to this click subprocess
+            enable_subprocess == True:A concurrent.futures.Future refers to this click
         """
         x, y = absolute_to_relative((x, y), (960, 540))
-        self.relative_click(x, y, times, delay, enable_subprocess)
+        return self.relative_click(x, y, times, delay, enable_subprocess, key)
 
-    def relative_swipe(self, x1, y1, x2, y2, duration=0.5, delay=0.5, *args, **kwargs):
+    def relative_swipe(
+        self, x1, y1, x2, y2, duration=0.5, delay=0.5, *args, key=None, **kwargs
+    ):
         """匀速滑动模拟器相对坐标 (x1,y1) 到 (x2,y2).
         Args:
             x1,y1,x2,y2:相对坐标
             duration:滑动总时间
             delay:滑动后延时(单位为秒)
+            key:滑动后延时的标识, 参考 settle
         """
         if delay < 0:
             raise ValueError("arg 'delay' should be positive or 0")
@@ -143,8 +265,8 @@ class AndroidController:
         input_str = f"input swipe {str(x1)} {str(y1)} {str(x2)} {str(y2)} {duration}"
         if self.config.SHOW_ANDROID_INPUT:
             self.logger.debug(input_str)
-        self.shell(input_str)
-        time.sleep(delay)
+        self.input_dispatcher.submit(input_str).result()
+        self.settle(delay, key)
 
     def swipe(self, x1, y1, x2, y2, duration=0.5, delay=0.5, *args, **kwargs):
         """匀速滑动模拟器相对坐标 (x1,y1) 到 (x2,y2).
@@ -183,14 +305,80 @@ class AndroidController:
         x, y = absolute_to_relative((x, y), (960, 540))
         self.relative_long_tap(x, y, duration, delay, *args, **kwargs)
 
+    def gesture(self) -> GestureScript:
+        """创建一个在设备上一次执行的 GestureScript, 添加完操作后调用 run() 执行"""
+        return GestureScript(self)
+
+    def run_gesture(self, script: GestureScript):
+        """用一条 shell 命令执行 GestureScript 中的所有操作, 执行完毕 (包括最后一步的延时) 后返回"""
+        cmd, duration, delay = script.render()
+        if cmd:
+            if self.config.SHOW_ANDROID_INPUT:
+                self.logger.debug(f"gesture: {cmd}")
+            timeout = duration + GESTURE_TIMEOUT_MARGIN
+            self.input_dispatcher.submit(cmd, timeout=timeout).result()
+        self.settle(delay)
+
+    def settle(self, delay, key=None):
+        """操作后等待画面稳定, 最多等待 delay 秒
+
+        开启 ADAPTIVE_DELAY 时根据该位置以往画面稳定所需的时间缩短等待, 参考 AdaptiveDelay,
+        否则等待 delay 秒
+        Args:
+            key (str, optional): 延时的标识, 同一处代码用于不同的界面切换时应指定.
+                Defaults to 调用栈位置, 参考 caller_site.
+        """
+        if not self.adaptive_delay.enabled:
+            time.sleep(delay)
+            return
+        frame = self.adaptive_delay.wait(key or caller_site(), delay)
+        if frame is not None:
+            self.set_screen(*frame)
+
     # ======== 屏幕相关 ========
     def update_screen(self):
-        self.screen = self.dev.snapshot(quality=99)
+        """截图并更新 self.screen
+
+        Returns:
+            bool: 画面内容是否与上一次截图不同
+        """
+        frame_id, screen = self.capture_backend.latest_frame()
+        return self.set_screen(frame_id, screen)
+
+    def set_screen(self, frame_id, screen):
+        """使用在其他地方 (如后台线程) 截取的一帧更新 self.screen, 参考 update_screen"""
+        if frame_id <= self.frame_id:
+            return False
+        self.frame_id, self.screen = frame_id, screen
+        screen_hash = zlib.crc32(self.screen)
+        changed = screen_hash != self.screen_hash
+        self.screen_hash = screen_hash
+        return changed
+
+    def wait_screen_change(self, timeout, gap=0.1):
+        """等待画面内容发生变化, 变化后 self.screen 为新的画面
+
+        stream 截图后端会阻塞到新帧到达; snapshot 截图后端每隔 gap 秒截图一次并比较内容
+        Args:
+            timeout (float): 最长等待时间
+            gap (float, optional): 轮询间隔. Defaults to 0.1.
+        Returns:
+            bool: 在 timeout 秒内画面是否发生变化
+        """
+        deadline = time.time() + timeout
+        while True:
+            remain = deadline - time.time()
+            if remain <= 0:
+                return False
+            self.capture_backend.wait_frame(self.frame_id, remain, gap)
+            if self.update_screen():
+                return True
 
     def get_screen(self, resolution=(1280, 720), need_screen_shot=True):
+        """返回缩放到 resolution 的截图, 参考 get_screen_view"""
         if need_screen_shot:
             self.update_screen()
-        return cv2.resize(self.screen, resolution)
+        return self.get_screen_view(resolution)
 
     def get_pixel(self, x, y, screen_shot=False) -> list:
         """获取当前屏幕相对坐标 (x,y) 处的像素值
@@ -200,11 +388,92 @@ class AndroidController:
         Returns:
             list[]: RGB 格式的像素值
         """
+        return self.get_pixels([(x, y)], screen_shot)[0].tolist()
+
+    def _get_view(self, key, create):
+        """按 key 缓存当前截图的派生视图, 有新截图时全部失效"""
+        if self._views_source is not self.screen:
+            self._views_source = self.screen
+            self._views = {}
+        view = self._views.get(key)
+        if view is None:
+            view = create()
+            self._views[key] = view
+        return view
+
+    def get_screen_view(self, resolution=None, gray=False):
+        """返回当前截图的派生视图, 同一帧截图的每种视图只计算一次
+
+        返回的图像被缓存共享, 调用方不应修改
+        Args:
+            resolution (tuple, optional): (宽, 高), 为 None 时为截图原始分辨率. Defaults to None.
+            gray (bool, optional): 是否为灰度图. Defaults to False.
+        """
+        native = self.screen.shape[1::-1]
+        resolution = native if resolution is None else tuple(resolution)
+
+        def create():
+            if gray and resolution == native:
+                return self.get_prepared_screen().gray
+            if gray:
+                return cv2.cvtColor(
+                    self.get_screen_view(resolution), cv2.COLOR_BGR2GRAY
+                )
+            if resolution == native:
+                return self.screen
+            return cv2.resize(self.screen, resolution)
+
+        return self._get_view((resolution, gray), create)
+
+    def get_screen_pil(self, mode="L", resolution=(960, 540)):
+        """返回当前截图的 PIL 图像, 与 PIM.fromarray(screen).convert(mode).resize(resolution) 一致
+
+        注意 self.screen 为 BGR 格式, 与原有识别程序保持一致, 此处不做通道转换
+        """
+
+        def create():
+            return PIM.fromarray(self.screen).convert(mode).resize(resolution)
+
+        return self._get_view(("PIL", mode, tuple(resolution)), create)
+
+    def get_pixels(self, positions, screen_shot=False) -> np.ndarray:
+        """批量获取当前屏幕 (960x540) 上多个点的像素值
+
+        Args:
+            positions: N 个 (x, y) 坐标, 相对 960x540 屏幕
+
+        Returns:
+            np.ndarray: 形状为 (N, 3) 的 RGB 像素值
+        """
         if screen_shot:
             self.update_screen()
-        if len(self.screen) != 540:
-            self.screen = cv2.resize(self.screen, (960, 540))
-        return [self.screen[y][x][2], self.screen[y][x][1], self.screen[y][x][0]]
+        positions = np.asarray(positions, dtype=np.intp).reshape(-1, 2)
+        view = self.get_screen_view((960, 540))
+        return view[positions[:, 1], positions[:, 0], ::-1]
+
+    def probe_colors(self, positions, colors, screen_shot=False):
+        """批量判断多个点的颜色最接近 colors 中的哪一个
+
+        Args:
+            positions: N 个 (x, y) 坐标, 相对 960x540 屏幕
+
+            colors: M 个 RGB 颜色, 例如 COLORS.BLOOD_COLORS[0]
+
+        Returns:
+            (np.ndarray, np.ndarray): 每个点最接近的颜色下标和欧氏距离
+        """
+        return nearest_colors(self.get_pixels(positions, screen_shot), colors)
+
+    def check_pixels(
+        self, positions, bgr_color, distance=30, screen_shot=False
+    ) -> np.ndarray:
+        """批量检查多个像素点是否满足要求, 参考 check_pixel
+
+        Returns:
+            np.ndarray: 每个点是否与 bgr_color 的欧氏距离小于 distance
+        """
+        _, distances = self.probe_colors(positions, [bgr_color[::-1]], screen_shot)
+        return distances < distance
 
     def check_pixel(self, position, bgr_color, distance=30, screen_shot=False) -> bool:
         """检查像素点是否满足要求
@@ -217,9 +486,7 @@ class AndroidController:
 
             screen_shot (bool, optional): 是否重新截图. Defaults to False.
         """
-        color = self.get_pixel(*position, screen_shot)
-        color.reverse()
-        return CalcDis(color, bgr_color) < distance**2
+        return bool(self.check_pixels([position], bgr_color, distance, screen_shot)[0])
 
     def locateCenterOnScreen(
         self, query: MyTemplate, confidence=0.85, this_methods=None
@@ -232,7 +499,7 @@ class AndroidController:
             否则返回 None
         """
         if this_methods is None:
-            this_methods = ["tpl"]
+            this_methods = [self.config.MATCH_METHOD]
         return locateCenterOnImage(self.screen, query, confidence, this_methods)
 
     def get_image_position(
@@ -248,12 +515,23 @@ class AndroidController:
             否则返回 None
         """
         if this_methods is None:
-            this_methods = ["tpl"]
+            this_methods = [self.config.MATCH_METHOD]
         images = image
         if not isinstance(images, Iterable):
             images = [images]
         if need_screen_shot:
             self.update_screen()
+        if len(this_methods) == 1 and this_methods[0] in SCREEN_METHODS:
+            images = list(images)
+            results = self.match_images(
+                images, confidence, False, True, this_methods[0]
+            )
+            i = first_match_index(results, confidence)
+            if i is None:
+                return None
+            res = TargetPos().getXY(results[i], images[i].target_pos)
+            rel_pos = absolute_to_relative(res, self.resolution)
+            return relative_to_absolute(rel_pos, (960, 540))
         for image in images:
             res = self.locateCenterOnScreen(image, confidence, this_methods)
             if res is not None:
@@ -270,16 +548,55 @@ class AndroidController:
             bool:如果存在为 True 否则为 False
         """
         if this_methods is None:
-            this_methods = ["tpl"]
+            this_methods = [self.config.MATCH_METHOD]
         if not isinstance(images, list):
             images = [images]
         if need_screen_shot:
             self.update_screen()
+        if len(this_methods) == 1 and this_methods[0] in SCREEN_METHODS:
+            results = self.match_images(
+                images, confidence, stop_on_first=True, method=this_methods[0]
+            )
+            return first_match_index(results, confidence) is not None
         return any(
             self.get_image_position(image, False, confidence, this_methods) is not None
             for image in images
         )
 
+    def get_prepared_screen(self) -> PreparedScreen:
+        """返回当前截图的 PreparedScreen, 同一帧截图只创建一次"""
+        if (
+            self._prepared_screen is None
+            or self._prepared_screen.image is not self.screen
+        ):
+            self._prepared_screen = PreparedScreen(self.screen)
+        return self._prepared_screen
+
+    def match_images(
+        self,
+        images,
+        confidence=0.85,
+        need_screen_shot=False,
+        stop_on_first=False,
+        method=None,
+    ):
+        """在当前截图上一次性匹配多个模板, 参考 match_many
+
+        Args:
+            images (list): 每一项为 MyTemplate 或 MyTemplate 列表
+            method (str, optional): "tpl" 或 "pyrtpl". Defaults to config.MATCH_METHOD.
+
+        Returns:
+            list: 每一项的最佳匹配结果, 可用 first_match_index 取第一个匹配的下标
+        """
+        if need_screen_shot:
+            self.update_screen()
+        if method is None:
+            method = self.config.MATCH_METHOD
+        return match_many(
+            self.get_prepared_screen(), images, confidence, stop_on_first, method
+        )
+
     def wait_image(
         self,
         image: MyTemplate,
@@ -299,19 +616,20 @@ class AndroidController:
             否则返回 False
         """
         if this_methods is None:
-            this_methods = ["tpl"]
+            this_methods = [self.config.MATCH_METHOD]
         if timeout < 0:
             raise ValueError("arg 'timeout' should at least be 0 but is ", str(timeout))
         StartTime = time.time()
+        self.update_screen()
         while True:
-            x = self.get_image_position(image, True, confidence, this_methods)
+            x = self.get_image_position(image, False, confidence, this_methods)
             if x != None:
                 time.sleep(after_get_delay)
                 return x
-            if time.time() - StartTime > timeout:
-                time.sleep(gap)
+            # 画面不变时不重复匹配
+            remain = timeout - (time.time() - StartTime)
+            if not self.wait_screen_change(remain, gap):
                 return False
-            time.sleep(gap)
 
     def wait_images(
         self, images=None, confidence=0.85, gap=0.15, after_get_delay=0, timeout=10
@@ -345,15 +663,19 @@ class AndroidController:
         else:
             images = images.__dict__.items()
 
+        images = list(images)
+        keys = [key for key, _ in images]
+        images = [image for _, image in images]
         StartTime = time.time()
+        self.update_screen()
         while True:
-            self.update_screen()
-            for res, image in images:
-                if self.image_exist(image, False, confidence):
-                    time.sleep(after_get_delay)
-                    return res
-            time.sleep(gap)
-            if time.time() - StartTime > timeout:
+            results = self.match_images(images, confidence, stop_on_first=True)
+            i = first_match_index(results, confidence)
+            if i is not None:
+                time.sleep(after_get_delay)
+                return keys[i]
+            remain = timeout - (time.time() - StartTime)
+            if not self.wait_screen_change(remain, gap):
                 return None
 
     def wait_images_position(
@@ -419,8 +741,7 @@ class AndroidController:
         """
         if need_screen_shot:
             self.update_screen()
-        screen = copy.deepcopy(self.screen)
-        screen = cv2.resize(screen, resolution)
+        screen = self.get_screen_view(resolution)
         if name is None:
             self.logger.log_image(
                 image=screen,
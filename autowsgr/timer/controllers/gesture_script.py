@@ -0,0 +1,75 @@
+from autowsgr.utils.api_image import absolute_to_relative, relative_to_absolute
+
+INPUT_COMMAND_TIME = 0.5  # 估计设备上每条 input 命令的启动时间, 用于计算超时
+
+
+class GestureScript:
+    """在设备上由一条 shell 命令连续执行的一组输入操作
+
+    适用于中间不需要检查画面的连续操作, 省去逐条发送命令的往返时间,
+    步骤之间的等待在设备上执行. 各方法的坐标和延时与 AndroidController 中的同名方法相同.
+
+    Example:
+        >>> timer.gesture().click(540, 180).keyevent(67, times=20).run()
+    """
+
+    def __init__(self, controller) -> None:
+        self.controller = controller
+        self.steps = []  # [(命令, 执行后等待的秒数)], 命令为 None 时只等待
+        self.input_time = 0  # 命令本身的执行时间, 如滑动时间
+
+    def relative_click(self, x, y, delay=0.5):
+        x, y = relative_to_absolute((x, y), self.controller.resolution)
+        self.steps.append(
+            (f"input tap {str(x)} {str(y)}", delay * self.controller.config.DELAY)
+        )
+        return self
+
+    def click(self, x, y, delay=0.1):
+        x, y = absolute_to_relative((x, y), (960, 540))
+        return self.relative_click(x, y, delay)
+
+    def relative_swipe(self, x1, y1, x2, y2, duration=0.5, delay=0.5):
+        x1, y1 = relative_to_absolute((x1, y1), self.controller.resolution)
+        x2, y2 = relative_to_absolute((x2, y2), self.controller.resolution)
+        cmd = f"input swipe {str(x1)} {str(y1)} {str(x2)} {str(y2)} {int(duration * 1000)}"
+        self.steps.append((cmd, delay))
+        self.input_time += duration
+        return self
+
+    def swipe(self, x1, y1, x2, y2, duration=0.5, delay=0.5):
+        x1, y1 = absolute_to_relative((x1, y1), (960, 540))
+        x2, y2 = absolute_to_relative((x2, y2), (960, 540))
+        return self.relative_swipe(x1, y1, x2, y2, duration, delay)
+
+    def keyevent(self, code, times=1, delay=0):
+        """按键, times 次按键合并为一条 input 命令"""
+        self.steps.append(("input keyevent " + " ".join([str(code)] * times), delay))
+        return self
+
+    def wait(self, seconds):
+        self.steps.append((None, seconds))
+        return self
+
+    def render(self):
+        """生成 shell 命令
+
+        Returns:
+            Tuple[str, float, float]: (shell 命令, 预计执行时间, 执行完后在本地等待的时间)
+        """
+        parts, pending = [], 0
+        duration = self.input_time
+        for cmd, delay in self.steps:
+            if cmd is not None:
+                if pending > 0:
+                    parts.append(f"sleep {pending:.3f}")
+                    duration += pending
+                    pending = 0
+                parts.append(cmd)
+                duration += INPUT_COMMAND_TIME
+            pending += delay
+        return "; ".join(parts), duration, pending
+
+    def run(self):
+        """执行并等待执行完毕, 参考 AndroidController.run_gesture"""
+        self.controller.run_gesture(self)
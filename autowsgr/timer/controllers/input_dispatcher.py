@@ -0,0 +1,89 @@
+import threading as th
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class InputDispatcher:
+    """输入命令分发线程
+
+    所有输入命令 (点击、滑动等) 都提交到同一个线程按顺序执行:
+        - 队列有上限, 队列满时提交方阻塞等待
+        - coalesce=True 的命令 (如点击加速) 在队列中已有相同的命令尚未执行时不再重复加入
+        - 两条命令开始执行的间隔不小于 1 / max_rate 秒, 避免向 adb 发送过多命令
+        - submit 返回 concurrent.futures.Future, 需要等待命令完成时调用 result()
+    """
+
+    def __init__(self, execute, logger, max_pending=16, max_rate=10) -> None:
+        """
+        Args:
+            execute (callable): 执行一条命令的函数, 在分发线程中调用
+            max_pending (int, optional): 队列中最多等待执行的命令数. Defaults to 16.
+            max_rate (float, optional): 每秒最多执行的命令数, 0 为不限制. Defaults to 10.
+        """
+        self.execute = execute
+        self.logger = logger
+        self.max_pending = max_pending
+        self.min_interval = 1 / max_rate if max_rate > 0 else 0
+        self.coalesced = 0  # 被合并的命令数
+        self._queue = deque()  # [(命令, 参数, Future, 是否可合并)]
+        self._pending = {}  # 队列中可合并的命令 -> Future
+        self._busy = False
+        self._last_start = 0
+        self._cond = th.Condition()
+        self._thread = th.Thread(target=self._run, name="input_dispatcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, cmd, coalesce=False, **kwargs) -> Future:
+        """提交一条命令
+
+        Args:
+            cmd (str): 命令
+            coalesce (bool, optional): 队列中已有相同的可合并命令时直接返回该命令的 Future. Defaults to False.
+            kwargs: 传给 execute 的其他参数
+        """
+        with self._cond:
+            if coalesce and cmd in self._pending:
+                self.coalesced += 1
+                return self._pending[cmd]
+            self._cond.wait_for(lambda: len(self._queue) < self.max_pending)
+            future = Future()
+            self._queue.append((cmd, kwargs, future, coalesce))
+            if coalesce:
+                self._pending[cmd] = future
+            self._cond.notify_all()
+            return future
+
+    def wait_idle(self, timeout=None):
+        """等待所有已提交的命令执行完毕
+
+        Returns:
+            bool: 是否在 timeout 秒内执行完毕
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._queue and not self._busy, timeout
+            )
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue)
+                cmd, kwargs, future, coalesce = self._queue.popleft()
+                if coalesce:
+                    del self._pending[cmd]
+                self._busy = True
+                self._cond.notify_all()
+
+            time.sleep(max(self._last_start + self.min_interval - time.time(), 0))
+            self._last_start = time.time()
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(self.execute(cmd, **kwargs))
+                except Exception as e:
+                    self.logger.error(f"输入命令执行失败: {cmd}, {e}")
+                    future.set_exception(e)
+
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
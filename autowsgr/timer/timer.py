@@ -1,6 +1,5 @@
 import inspect
 import os
-import threading as th
 import time
 from typing import List
 
@@ -9,14 +8,25 @@ from autowsgr.constants.custom_exceptions import (
     ImageNotFoundErr,
     NetworkErr,
 )
-from autowsgr.constants.data_roots import DATA_ROOT, IMG_ROOT, OCR_ROOT
+from autowsgr.constants.data_roots import (
+    DATA_ROOT,
+    IMG_ROOT,
+    OCR_ROOT,
+    PAGE_SIGNATURE_PATH,
+)
 from autowsgr.constants.image_templates import IMG
 from autowsgr.constants.other_constants import ALL_PAGES, NO
 from autowsgr.constants.ui import WSGR_UI, Node
-from autowsgr.timer.backends import EasyocrBackend, OCRBackend, PaddleOCRBackend
+from autowsgr.timer.backends import (
+    EasyocrBackend,
+    OCRBackend,
+    PaddleOCRBackend,
+    RemoteOCRBackend,
+)
 from autowsgr.timer.controllers import AndroidController, WindowsController
 from autowsgr.utils.io import yaml_to_dict
 from autowsgr.utils.operator import unzip_element
+from autowsgr.utils.page_signature import PageSignatures
 
 
 class Timer(AndroidController, WindowsController):
@@ -50,19 +60,26 @@ class Timer(AndroidController, WindowsController):
     def __init__(self, config, logger):
         self.config = config
         self.logger = logger
+        start_time = time.time()
 
-        # 初始化android控制器
-        WindowsController.__init__(self, config.emulator, logger)
-
-        dev = self.connect_android()
-        AndroidController.__init__(self, config, logger, dev)
-
+        # OCR 模型在第一次识别时加载, 或在连接模拟器的同时在后台加载
         if self.config.OCR_BACKEND == "easyocr":
             self.ocr_backend = EasyocrBackend(config, logger)
         elif self.config.OCR_BACKEND == "paddleocr":
             self.ocr_backend = PaddleOCRBackend(config, logger)
+        elif self.config.OCR_BACKEND == "remote":
+            self.ocr_backend = RemoteOCRBackend(config, logger)
         else:
             raise ValueError(f"Unknown OCR_BACKEND: {self.config.OCR_BACKEND}")
+        if self.config.OCR_PRELOAD:
+            self.ocr_backend.warm_up()
+
+        # 初始化android控制器
+        WindowsController.__init__(self, config.emulator, logger)
+
+        dev = self.connect_android()
+        AndroidController.__init__(self, config, logger, dev, start_time)
+        self.page_signatures = PageSignatures.load(PAGE_SIGNATURE_PATH)
 
         # 获取调用栈信息
         stack = inspect.stack()
@@ -102,6 +119,8 @@ class Timer(AndroidController, WindowsController):
             self.ship_names = unzip_element(
                 list(yaml_to_dict(config.SHIP_NAME_PATH).values())
             )
+        # 预先建立舰船名索引, 修正 OCR 结果时只需在少量候选中模糊匹配
+        self.ocr_backend.candidate_index(self.ship_names)
 
         self.init()
 
@@ -115,6 +134,7 @@ class Timer(AndroidController, WindowsController):
         allow_nan=False,
         rgb_select=None,
         tolerance=30,
+        preprocess=None,
         **kwargs,
     ):
         """识别任意字符串"""
@@ -126,6 +146,7 @@ class Timer(AndroidController, WindowsController):
             allow_nan,
             rgb_select,
             tolerance,
+            preprocess,
             **kwargs,
         )
 
@@ -137,6 +158,39 @@ class Timer(AndroidController, WindowsController):
             img, extra_chars, multiple, allow_nan, **kwargs
         )
 
+    def recognize_batch(
+        self,
+        imgs,
+        allowlist: List[str] = None,
+        candidates: List[str] = None,
+        multiple=False,
+        allow_nan=False,
+        rgb_select=None,
+        tolerance=30,
+        preprocess=None,
+        **kwargs,
+    ):
+        """一次识别多张图片中的任意字符串, 返回与 imgs 一一对应的结果"""
+        return self.ocr_backend.recognize_batch(
+            imgs,
+            allowlist,
+            candidates,
+            multiple,
+            allow_nan,
+            rgb_select,
+            tolerance,
+            preprocess,
+            **kwargs,
+        )
+
+    def recognize_number_batch(
+        self, imgs, extra_chars="", multiple=False, allow_nan=False, **kwargs
+    ):
+        """一次识别多张图片中的数字, 返回与 imgs 一一对应的结果"""
+        return self.ocr_backend.recognize_number_batch(
+            imgs, extra_chars, multiple, allow_nan, **kwargs
+        )
+
     def recognize_ship(self, image, candidates, **kwargs):
         """传入一张图片,返回舰船信息,包括名字和舰船型号"""
         return self.ocr_backend.recognize_ship(image, candidates, **kwargs)
@@ -198,17 +252,10 @@ class Timer(AndroidController, WindowsController):
             self.click(460, 380)
             if self.wait_image(IMG.start_image[4]) == False:
                 raise TimeoutError("can't logout successfully")
-            self.click(540, 180)
-            for _ in range(20):
-                p = th.Thread(target=lambda: self.shell("input keyevent 67"))
-                p.start()
-            p.join()
+            # 清空输入框
+            self.gesture().click(540, 180).keyevent(67, times=20).run()
             self.text(str(account))
-            self.click(540, 260)
-            for _ in range(20):
-                p = th.Thread(target=lambda: self.shell("input keyevent 67"))
-                p.start()
-            p.join()
+            self.gesture().click(540, 260).keyevent(67, times=20).run()
             time.sleep(0.5)
             self.text(str(password))
             self.click(400, 330)
@@ -251,7 +298,7 @@ class Timer(AndroidController, WindowsController):
     def restart(self, times=0, *args, **kwargs):
         try:
             self.shell(f"am force-stop {self.app_name}")
-            self.shell("input keyevent 3")
+            self.key_event(3)
             self.start_game(**kwargs)
         except:
             if self.is_android_online() == False:
@@ -338,9 +385,9 @@ class Timer(AndroidController, WindowsController):
     # ========================= 维护当前所在游戏界面 =========================
     def _integrative_page_identify(self):
         positions = [(171, 47), (300, 47), (393, 47), (504, 47), (659, 47)]
-        for i, position in enumerate(positions):
-            if self.check_pixel(position, (225, 130, 16)):
-                return i + 1
+        matched = self.check_pixels(positions, (225, 130, 16))
+        if matched.any():
+            return int(matched.argmax()) + 1
 
     def identify_page(self, name, need_screen_shot=True):
         if need_screen_shot:
@@ -363,16 +410,16 @@ class Timer(AndroidController, WindowsController):
         start_time = time.time()
         if isinstance(names, str):
             names = [names]
+        self.update_screen()
         while True:
-            self.update_screen()
             for i, name in enumerate(names):
                 if self.identify_page(name, 0):
                     time.sleep(after_wait)
                     return i + 1
 
-            if time.time() - start_time > timeout:
+            remain = timeout - (time.time() - start_time)
+            if not self.wait_screen_change(remain, gap):
                 break
-            time.sleep(gap)
 
         if self.is_bad_network(timeout=3):
             if self.process_bad_network("can't wait pages"):
@@ -384,9 +431,16 @@ class Timer(AndroidController, WindowsController):
         raise TimeoutError(f"identify timeout of{str(names)}")
 
     def get_now_page(self):
-        """获取并返回当前页面名称"""
+        """获取并返回当前页面名称
+
+        先用像素签名表分类, 签名一致的界面优先进行模板匹配确认,
+        确认失败 (如弹窗遮挡, 或界面没有签名) 时再按顺序检查其余界面
+        """
         self.update_screen()
-        for page in ALL_PAGES:
+        candidates = self.page_signatures.classify(self.screen)
+        # 签名只用于排序, 唯一的候选也需要模板确认
+        pages = candidates + [page for page in ALL_PAGES if page not in candidates]
+        for page in pages:
             if self.identify_page(page, need_screen_shot=False):
                 return page
         return "unknown_page"
@@ -399,11 +453,12 @@ class Timer(AndroidController, WindowsController):
         for next in ui_list[1:]:
             edge = self.now_page.find_edge(next)
             opers = edge.operate()
+            edge_name = f"{self.now_page.name}->{next.name}"
             self.now_page = next
-            for oper in opers:
+            for i, oper in enumerate(opers):
                 fun, args = oper
                 if fun == "click":
-                    self.click(*args)
+                    self.click(*args, key=f"operate:{edge_name}:{i}")
                 else:
                     self.logger.error(f"unknown function name: {fun}")
                     raise BaseException()
@@ -425,7 +480,7 @@ class Timer(AndroidController, WindowsController):
                 return
             else:
                 self.wait_pages(names=[self.now_page.name])
-            time.sleep(0.25)
+            self.settle(0.25, key=f"operate:{self.now_page.name}")
 
     def set_page(self, page_name=None, page=None):
         if page_name is None and page is None:
@@ -1,9 +1,9 @@
-from typing import List, Tuple
+from typing import List, Optional, Tuple, Union
 
 import cv2
 import numpy as np
 
-from autowsgr.constants.image_templates import MyTemplate
+from autowsgr.constants.image_templates import MyTemplate, PreparedScreen
 
 
 def relative_to_absolute(record_pos, resolution=(960, 540)):
@@ -246,6 +246,108 @@ def locateCenterOnImage(
     return match_pos or None
 
 
+def match_many(
+    screen: Union[np.ndarray, PreparedScreen],
+    templates,
+    confidence=0.85,
+    stop_on_first=False,
+    method="tpl",
+) -> List[Optional[dict]]:
+    """在同一帧截图上一次性匹配多个模板, 截图的灰度图和金字塔只计算一次
+
+    Args:
+        screen (np.ndarray | PreparedScreen): 截图
+        templates (list): 每一项为 MyTemplate 或 MyTemplate 列表 (列表中任意一张匹配即视为匹配)
+        confidence (float, optional): 置信度阈值. Defaults to 0.85.
+        stop_on_first (bool, optional): 为 True 时匹配到第一个超过阈值的项后停止. Defaults to False.
+        method (str, optional): 匹配方式, "tpl" 或 "pyrtpl". Defaults to "tpl".
+
+    Returns:
+        list: 与 templates 一一对应的最佳匹配结果 (airtest 格式的 dict, "confidence" 为得分),
+        未计算的项为 None
+    """
+    if not isinstance(screen, PreparedScreen):
+        screen = PreparedScreen(screen)
+    results = [None] * len(templates)
+    for i, group in enumerate(templates):
+        if isinstance(group, MyTemplate):
+            group = [group]
+        for template in group:
+            ret = template.match_screen(screen, confidence, method)
+            if ret is None:
+                continue
+            if results[i] is None or ret["confidence"] > results[i]["confidence"]:
+                results[i] = ret
+            if ret["confidence"] >= confidence:
+                results[i] = ret
+                break
+        hit = results[i] is not None and results[i]["confidence"] >= confidence
+        if stop_on_first and hit:
+            break
+    return results
+
+
+def first_match_index(results: List[Optional[dict]], confidence=0.85):
+    """返回 match_many 结果中第一个超过阈值的下标, 没有则返回 None"""
+    for i, ret in enumerate(results):
+        if ret is not None and ret["confidence"] >= confidence:
+            return i
+    return None
+
+
+# 舰船名称所在蓝色文本框的颜色 (BGR), 与 c_src/locator.cpp 一致
+TEXT_BOX_COLORS = np.array([[162, 98, 18], [173, 103, 17], [196, 116, 16]])
+TEXT_BOX_DISTANCE = 20
+TEXT_BOX_MIN_WIDTH = 11  # 一行中至少有这么长的连续文本框颜色才视为文本框所在行
+TEXT_BOX_WINDOW = 8  # 文本框所在行的上方或下方 8 行中至少 6 行也需要是文本框所在行
+TEXT_BOX_MIN_ROWS = 6
+
+
+def locate_text_boxes(image: np.ndarray):
+    """定位舰船名称所在的蓝色文本框, 将其他行涂白, 与 locator.exe 的结果一致
+
+    Args:
+        image (np.ndarray): BGR 图像
+
+    Returns:
+        Tuple[np.ndarray, list]: (涂白后的图像副本, 文本框所在行的区间 [(start, end), ...])
+    """
+    n, m = image.shape[:2]
+    # 先用包围盒筛出候选像素, 只对候选像素计算到各颜色的距离
+    key = cv2.inRange(
+        image,
+        TEXT_BOX_COLORS.min(axis=0) - TEXT_BOX_DISTANCE,
+        TEXT_BOX_COLORS.max(axis=0) + TEXT_BOX_DISTANCE,
+    ).astype(bool)
+    ys, xs = np.nonzero(key)
+    diff = image[ys, xs][:, None, :].astype(np.int32) - TEXT_BOX_COLORS
+    key[ys, xs] = ((diff * diff).sum(axis=2) < TEXT_BOX_DISTANCE**2).any(axis=1)
+
+    # 每个位置左侧 (含自身) 最近的非文本框颜色的列, 用于求连续段的起点
+    columns = np.arange(m, dtype=np.int16)
+    last_gap = np.maximum.accumulate(np.where(key, -1, columns), axis=1)
+    # 在第 j 列结束的连续段 (第 j - 1 列是, 第 j 列不是)
+    ends = key[:, :-1] & ~key[:, 1:]
+    start = last_gap[:, :-1] + 1
+    start[start == 0] = -1  # 从第 0 列开始的段按 locator.exe 的方式计算长度
+    length = columns[1:] - start
+    has_box = (ends & (length >= TEXT_BOX_MIN_WIDTH)).any(axis=1)
+    has_box[0] = False
+
+    # 上方 / 下方各 TEXT_BOX_WINDOW 行中有文本框的行数
+    count = np.concatenate([[0], np.cumsum(has_box)])
+    rows = np.arange(n)
+    above = count[rows] - count[np.maximum(rows - TEXT_BOX_WINDOW, 0)]
+    below = count[np.minimum(rows + TEXT_BOX_WINDOW + 1, n)] - count[rows + 1]
+    legal = has_box & (np.maximum(above, below) >= TEXT_BOX_MIN_ROWS)
+
+    result = image.copy()
+    result[~legal] = 255
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], legal.astype(np.int8)])))
+    starts, stops = edges[::2], edges[1::2]
+    return result, list(zip(starts.tolist(), stops.tolist()))
+
+
 def match_nearest_index(
     pos: Tuple[int, int], positions: List[Tuple[int, int]], metric: str = "l2"
 ):
@@ -0,0 +1,63 @@
+import hashlib
+from collections import Counter, defaultdict
+from typing import Iterable, List
+
+from thefuzz import process
+from thefuzz.utils import full_process
+
+SHORTLIST_SIZE = 32  # 模糊匹配时参与打分的候选数
+MIN_SHORTLIST_SCORE = 70  # 候选中的最佳得分低于该值时退回到全部候选中匹配
+
+
+def ngrams(text: str) -> List[str]:
+    """字符串的单字和相邻双字"""
+    return list(text) + [text[i : i + 2] for i in range(len(text) - 1)]
+
+
+class CandidateIndex:
+    """候选词的索引, 用于把 OCR 结果修正为最接近的候选词
+
+    与某个候选词完全一致的结果直接查表;
+    其余结果先用单字/双字倒排索引选出共享字符最多的少量候选, 只在这些候选中计算编辑距离,
+    候选中的最佳得分过低时才退回到全量匹配. 结果与 process.extractOne(text, candidates)[0] 一致.
+    """
+
+    def __init__(self, candidates: Iterable[str]) -> None:
+        self.candidates = list(candidates)
+        self.exact = {}  # 完全命中的候选词 -> 匹配结果, 第一次命中时计算
+        self.index = defaultdict(list)
+        self.gram_count = []
+        for i, candidate in enumerate(self.candidates):
+            grams = set(ngrams(full_process(candidate)))
+            for gram in grams:
+                self.index[gram].append(i)
+            self.gram_count.append(len(grams))
+        self._candidate_set = set(self.candidates)
+        # 候选词列表的哈希, 用作 OCR 缓存键的一部分
+        self.key = hashlib.blake2b(
+            "\n".join(self.candidates).encode(), digest_size=16
+        ).hexdigest()
+
+    def __len__(self):
+        return len(self.candidates)
+
+    def extract_one(self, text: str) -> str:
+        """返回与 text 最接近的候选词"""
+        if text in self._candidate_set:
+            if text not in self.exact:
+                self.exact[text] = process.extractOne(text, self.candidates)[0]
+            return self.exact[text]
+
+        grams = set(ngrams(full_process(text)))
+        counts = Counter(i for gram in grams for i in self.index.get(gram, ()))
+        if counts:
+            shortlist = {i for i, _ in counts.most_common(SHORTLIST_SIZE)}
+            # 所有字符都出现在 text 中的短候选词部分匹配得分很高, 必须参与打分
+            shortlist.update(i for i, n in counts.items() if n == self.gram_count[i])
+            # 保持候选词的原始顺序, 使得分相同时的结果与全量匹配一致
+            choice, score = process.extractOne(
+                text, [self.candidates[i] for i in sorted(shortlist)]
+            )
+            if score >= MIN_SHORTLIST_SCORE:
+                return choice
+        return process.extractOne(text, self.candidates)[0]
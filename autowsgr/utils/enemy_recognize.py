@@ -0,0 +1,126 @@
+import os
+from functools import lru_cache
+from typing import List, Sequence
+
+import numpy as np
+
+from autowsgr.constants.data_roots import TUNNEL_ROOT
+
+TEMPLATE_DATA_PATH = os.path.join(TUNNEL_ROOT, "TemplateData")
+
+# 以下四组舰种的图标只有一半有区别, 两个候选模板同属一组时只比较半边图像
+# S1, S2 比较左半边, S3, S4 比较右半边 (与 c_src/recognize_enemy.cpp 一致)
+LEFT_HALF_GROUPS = [
+    {"CA", "CL", "CAV", "CLT", "CBG", "BC"},
+    {"CV", "AV", "CVL"},
+]
+RIGHT_HALF_GROUPS = [
+    {"BB", "BC"},
+    {"CL", "CVL"},
+]
+HALF_WIDTH = 16
+BRIGHTNESS_RATIO = 3  # 亮度相差超过该倍数时直接视为完全不同
+SHIFTS = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+
+
+def normalize(images: np.ndarray):
+    """增强对比度并归一化, 返回 (归一化后的图像, 亮度)
+
+    Args:
+        images (np.ndarray): 形状为 (k, n, m) 的灰度图像
+    """
+    images = images.astype(np.float64)
+    brightness = images.sum(axis=(1, 2))
+    mean = (brightness / (images.shape[1] * images.shape[2]))[:, None, None]
+    images = images + np.where(images > mean * 1.2, 10, 0)
+    images = images - np.where(images < mean * 0.8, 10, 0)
+    return images / images.sum(axis=(1, 2), keepdims=True), brightness
+
+
+@lru_cache(maxsize=None)
+def load_templates(path=TEMPLATE_DATA_PATH):
+    """读取舰种模板, 返回 (舰种名列表, 归一化后的模板, 亮度)"""
+    with open(path) as f:
+        tokens = f.read().split()
+    count, pos = int(tokens[0]), 1
+    names, images = [], []
+    for _ in range(count):
+        name, n, m = tokens[pos], int(tokens[pos + 1]), int(tokens[pos + 2])
+        pixels = np.array(tokens[pos + 3 : pos + 3 + n * m], dtype=np.float64)
+        names.append(name)
+        images.append(pixels.reshape(n, m))
+        pos += 3 + n * m
+    templates, brightness = normalize(np.stack(images))
+    return names, templates, brightness
+
+
+def shift_distance(targets: np.ndarray, templates: np.ndarray):
+    """目标与模板在 3x3 平移范围内的最小 L1 距离
+
+    Args:
+        targets (np.ndarray): (t, n, m)
+        templates (np.ndarray): (k, n, m)
+
+    Returns:
+        np.ndarray: (t, k)
+    """
+    n, m = targets.shape[1:]
+    a, b = targets[:, None], templates[None]
+    result = None
+    for dy, dx in SHIFTS:
+        ya, yb = slice(max(-dy, 0), n - max(dy, 0)), slice(max(dy, 0), n + min(dy, 0))
+        xa, xb = slice(max(-dx, 0), m - max(dx, 0)), slice(max(dx, 0), m + min(dx, 0))
+        distance = np.abs(a[..., ya, xa] - b[..., yb, xb]).sum(axis=(2, 3))
+        result = distance if result is None else np.minimum(result, distance)
+    return result
+
+
+def _same_group(name1, name2, groups):
+    return any(name1 in group and name2 in group for group in groups)
+
+
+def recognize_enemy(images: Sequence[np.ndarray], path=TEMPLATE_DATA_PATH) -> List[str]:
+    """识别敌方舰种, 与 recognize_enemy.exe 的结果一致
+
+    Args:
+        images: 每个敌舰位置的灰度图像 (TYPE_SCAN_AREA 的截取结果, 16x32)
+
+    Returns:
+        list: 每个位置的舰种名, 没有舰船时为 "NO"
+    """
+    if not len(images):
+        return []
+    names, templates, template_brightness = load_templates(path)
+    targets, brightness = normalize(np.stack(images))
+
+    # 一次算出所有目标与所有模板在整图, 左半边, 右半边上的距离
+    distance = {
+        "full": shift_distance(targets, templates),
+        "left": shift_distance(targets[..., :HALF_WIDTH], templates[..., :HALF_WIDTH]),
+        "right": shift_distance(
+            targets[..., HALF_WIDTH : 2 * HALF_WIDTH],
+            templates[..., HALF_WIDTH : 2 * HALF_WIDTH],
+        ),
+    }
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.maximum(brightness[:, None], template_brightness) / np.minimum(
+            brightness[:, None], template_brightness
+        )
+    different = ratio >= BRIGHTNESS_RATIO
+    for value in distance.values():
+        value[different] = 1.0
+
+    result = []
+    for t in range(len(targets)):
+        now = 0
+        for j in range(1, len(names)):
+            if _same_group(names[now], names[j], RIGHT_HALF_GROUPS):
+                mode = "right"
+            elif _same_group(names[now], names[j], LEFT_HALF_GROUPS):
+                mode = "left"
+            else:
+                mode = "full"
+            if distance[mode][t, now] > distance[mode][t, j]:
+                now = j
+        result.append(names[now])
+    return result
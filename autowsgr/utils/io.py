@@ -166,10 +166,16 @@ def namespace_to_dict(namespace):
     return {key: namespace_to_dict(value) for key, value in namespace.__dict__.items()}
 
 
+ROI_SIDECAR = "roi.yaml"  # 图片目录下记录模板搜索区域的文件
+
+
 def create_namespace(directory, template):
     """
     根据文件夹层次结构创建 SimpleNamespace 对象.
 
+    如果图片所在文件夹中有 roi.yaml (格式为 {文件名(不含后缀): [x1, y1, x2, y2]}),
+    对应的模板会以 roi 参数创建.
+
     Args:
         directory (str): 要遍历的根目录.
         template (type): 用于创建 file 对象的模板.
@@ -192,6 +198,16 @@ def create_namespace(directory, template):
 
     root = Path(directory)
     namespace = MyNamespace()
+    sidecars = {}
+
+    def create_template(path):
+        if path.parent not in sidecars:
+            sidecar = path.parent / ROI_SIDECAR
+            sidecars[path.parent] = (
+                (yaml_to_dict(sidecar) or {}) if sidecar.exists() else {}
+            )
+        roi = sidecars[path.parent].get(path.stem)
+        return template(path) if roi is None else template(path, roi=roi)
 
     for path in sorted(
         root.rglob("*.png"), key=cmp_to_key(compare_length_and_alphabet)
@@ -208,7 +224,7 @@ def create_namespace(directory, template):
             # 1. 一个文件夹内全是数字的情况
             if not hasattr(current, folder):
                 setattr(current, folder, [None])  # 占位符
-            getattr(current, folder).append(template(path))
+            getattr(current, folder).append(create_template(path))
         else:
             if not hasattr(current, folder):
                 setattr(current, folder, MyNamespace())
@@ -218,10 +234,10 @@ def create_namespace(directory, template):
                 filename = filename.rstrip(r"0123456789")
                 if not hasattr(current, filename):
                     setattr(current, filename, [])
-                getattr(current, filename).append(template(path))
+                getattr(current, filename).append(create_template(path))
             else:
                 # 3. 字符串文件情况
-                setattr(current, filename, template(path))
+                setattr(current, filename, create_template(path))
 
     # pprint(namespace_to_dict(namespace))
     return namespace
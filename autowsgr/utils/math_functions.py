@@ -52,6 +52,23 @@ def CheckColor(col, ColorList):
     return get_nearest(col, ColorList)
 
 
+def nearest_colors(pixels, colors):
+    """批量计算每个像素最接近的颜色 (欧几里得距离)
+
+    Args:
+        pixels : N 个像素值, 形状为 (N, 3)
+        colors : M 个待选颜色, 形状为 (M, 3), 需与 pixels 使用相同的通道顺序
+
+    Returns:
+        (np.ndarray, np.ndarray): 每个像素最接近的颜色下标 (距离相同时取靠前的) 和对应的距离
+    """
+    pixels = np.asarray(pixels, dtype=np.int32).reshape(-1, 1, 3)
+    colors = np.asarray(colors, dtype=np.int32).reshape(1, -1, 3)
+    distances = np.sqrt(((pixels - colors) ** 2).sum(axis=2))
+    index = distances.argmin(axis=1)
+    return index, distances[np.arange(len(index)), index]
+
+
 def matrix_to_str(matrix: np.ndarray):
     """将一个矩阵转化为字符串,格式为:第一行两个正整数 n,m 表示行数和列数,接下来 n 行每行 m 列
 
@@ -0,0 +1,129 @@
+import os
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+from autowsgr.utils.io import dict_to_yaml, yaml_to_dict
+
+PROBE_DISTANCE = 30  # 像素颜色与签名颜色的最大欧氏距离, 与 check_pixel 的默认值一致
+GRID_STEP = 8  # 生成签名时候选采样点的间隔 (960x540)
+STABLE_DISTANCE = 12  # 同一界面的多张截图在采样点上的最大颜色差
+MAX_PROBES = 8  # 每个界面最多使用的采样点数
+NEIGHBOR_OFFSETS = [(dx, dy) for dx in (-2, 0, 2) for dy in (-2, 0, 2) if dx or dy]
+
+
+class PageSignatures:
+    """界面像素签名表
+
+    每个界面对应若干个 (x, y, 颜色) 采样点, 截图在某个界面的所有采样点上颜色都接近时,
+    视为可能处于该界面. 所有界面的采样点一次性用 numpy 取出并比较.
+
+    签名文件格式 (坐标相对 960x540 屏幕, 颜色为 BGR):
+        page_name:
+          - [x, y, b, g, r]
+    """
+
+    def __init__(self, table: Dict[str, List[List[int]]]) -> None:
+        self.pages = [page for page, probes in table.items() if probes]
+        probes = [
+            (i, probe) for i, page in enumerate(self.pages) for probe in table[page]
+        ]
+        self._page_index = np.array([i for i, _ in probes], dtype=np.intp)
+        data = np.array([probe for _, probe in probes], dtype=np.int32).reshape(-1, 5)
+        self._positions = data[:, :2]
+        self._colors = data[:, 2:]
+
+    @classmethod
+    def load(cls, path):
+        """从签名文件读取, 文件不存在时返回空表"""
+        if not os.path.exists(path):
+            return cls({})
+        return cls(yaml_to_dict(path) or {})
+
+    def __len__(self):
+        return len(self.pages)
+
+    def __contains__(self, page):
+        return page in self.pages
+
+    def classify(self, screen: np.ndarray) -> List[str]:
+        """返回与截图签名一致的所有界面名
+
+        Args:
+            screen (np.ndarray): 任意分辨率的 BGR 截图
+        """
+        if not self.pages:
+            return []
+        h, w = screen.shape[:2]
+        xs = self._positions[:, 0] * w // 960
+        ys = self._positions[:, 1] * h // 540
+        diff = screen[ys, xs].astype(np.int32) - self._colors
+        failed = (diff * diff).sum(axis=1) >= PROBE_DISTANCE**2
+        failures = np.bincount(self._page_index[failed], minlength=len(self.pages))
+        return [page for page, count in zip(self.pages, failures) if count == 0]
+
+
+def generate_page_signatures(screens: Dict[str, List[np.ndarray]]):
+    """根据每个界面的参考截图生成签名表
+
+    对每个界面, 只选择在该界面的所有截图中颜色稳定的采样点, 并贪心地选择能排除最多其他界面的点,
+    直到所有其他界面都被至少一个采样点排除, 或达到 MAX_PROBES
+
+    Args:
+        screens (dict): 界面名 -> 该界面的截图列表 (BGR, 任意分辨率)
+
+    Returns:
+        dict: 可以传给 PageSignatures 或写入签名文件的表
+    """
+    grid_y, grid_x = np.mgrid[
+        GRID_STEP // 2 : 540 : GRID_STEP, GRID_STEP // 2 : 960 : GRID_STEP
+    ]
+    grid_x, grid_y = grid_x.ravel(), grid_y.ravel()
+
+    means, stable = {}, {}
+    for page, images in screens.items():
+        images = [cv2.resize(image, (960, 540)).astype(np.int32) for image in images]
+        samples = np.stack([image[grid_y, grid_x] for image in images])
+        mean = samples.mean(axis=0)
+        spread = np.sqrt(((samples - mean) ** 2).sum(axis=2)).max(axis=0)
+        # 采样点周围也需要颜色一致, 避免不同分辨率下取整到相邻像素时颜色突变
+        for dx, dy in NEIGHBOR_OFFSETS:
+            for image, sample in zip(images, samples):
+                neighbor = image[grid_y + dy, grid_x + dx]
+                distance = np.sqrt(((neighbor - sample) ** 2).sum(axis=1))
+                spread = np.maximum(spread, distance)
+        means[page] = mean
+        stable[page] = spread <= STABLE_DISTANCE
+
+    table = {}
+    for page in screens:
+        others = [other for other in screens if other != page]
+        # excluded[j, k]: 第 k 个采样点可以排除第 j 个其他界面
+        excluded = np.array(
+            [
+                np.sqrt(((means[other] - means[page]) ** 2).sum(axis=1))
+                >= 2 * PROBE_DISTANCE
+                for other in others
+            ]
+        ).reshape(len(others), len(grid_x))
+        candidates = stable[page].copy()
+        remaining = np.ones(len(others), dtype=bool)
+        probes = []
+        while len(probes) < MAX_PROBES and candidates.any():
+            gains = np.where(candidates, excluded[remaining].sum(axis=0), -1)
+            best = int(gains.argmax())
+            if probes and gains[best] <= 0:
+                break
+            candidates[best] = False
+            remaining &= ~excluded[:, best]
+            b, g, r = (int(round(c)) for c in means[page][best])
+            probes.append([int(grid_x[best]), int(grid_y[best]), b, g, r])
+            if not remaining.any():
+                break
+        table[page] = probes
+    return table
+
+
+def save_page_signatures(table, path):
+    dict_to_yaml(table, path)
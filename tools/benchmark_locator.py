@@ -0,0 +1,58 @@
+"""测试舰船名称文本框定位的耗时
+
+默认使用 autowsgr/data/images/ocr_test 中的截图, 也可以传入选船界面截图所在的目录.
+在 Windows 上同时测试原来的 locator.exe (写 OCR.PNG -> 启动进程 -> 读 1.PNG) 并比较结果.
+
+用法:
+    python tools/benchmark_locator.py [截图目录] [次数]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import cv2
+
+from autowsgr.constants.data_roots import IMG_ROOT, TUNNEL_ROOT
+from autowsgr.utils.api_image import locate_text_boxes
+from autowsgr.utils.io import listdir
+
+
+def run_exe(image):
+    image_path = os.path.join(TUNNEL_ROOT, "OCR.PNG")
+    cv2.imwrite(image_path, image)
+    with open(os.path.join(TUNNEL_ROOT, "locator.in"), "w+") as f:
+        f.write(image_path)
+    subprocess.run([os.path.join(TUNNEL_ROOT, "locator.exe"), TUNNEL_ROOT])
+    return cv2.imread(os.path.join(TUNNEL_ROOT, "1.PNG"))
+
+
+def main(root, times=20):
+    images = [cv2.imread(file) for file in listdir(root)]
+    images = [image for image in images if image is not None]
+    if not images:
+        print(f"no image found in {root}")
+        return
+
+    start = time.perf_counter()
+    for _ in range(times):
+        results = [locate_text_boxes(image)[0] for image in images]
+    cost = (time.perf_counter() - start) / times / len(images)
+    print(f"locate_text_boxes: {cost * 1000:.2f} ms/image ({len(images)} images)")
+
+    if os.name != "nt":
+        return
+    start = time.perf_counter()
+    exe_results = [run_exe(image) for image in images]
+    cost = (time.perf_counter() - start) / len(images)
+    print(f"locator.exe: {cost * 1000:.2f} ms/image")
+    same = sum((a == b).all() for a, b in zip(results, exe_results))
+    print(f"same result: {same}/{len(images)}")
+
+
+if __name__ == "__main__":
+    root = sys.argv[1] if len(sys.argv) > 1 else os.path.join(IMG_ROOT, "ocr_test")
+    main(root, int(sys.argv[2]) if len(sys.argv) > 2 else 20)
@@ -0,0 +1,108 @@
+"""比较 "tpl" 和 "pyrtpl" 两种模板匹配方式的结果和耗时
+
+在每张截图上用两种方式分别匹配全部模板 (autowsgr/data/images), 统计每张截图的匹配耗时,
+并列出两种方式结果不一致的模板: 是否超过阈值不同, 或都超过阈值但位置相差超过 MAX_OFFSET 像素.
+截图可以是游戏运行时保存的截图 (如 log 目录下的截图), 分辨率任意.
+
+用法:
+    python tools/benchmark_match.py 截图目录 [次数]
+"""
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import cv2
+
+from autowsgr.constants.image_templates import (
+    IMG,
+    SCREEN_METHODS,
+    PreparedScreen,
+    iter_templates,
+    preload_templates,
+)
+from autowsgr.utils.io import listdir
+
+MAX_OFFSET = 2  # 两种方式匹配位置的最大允许差距 (像素)
+
+
+def match_all(screen, templates, method):
+    """用 method 在截图上匹配所有模板, 返回 (每个模板的结果, 耗时)"""
+    start = time.perf_counter()
+    prepared = PreparedScreen(screen)
+    results = [template.match_screen(prepared, method=method) for template in templates]
+    return results, time.perf_counter() - start
+
+
+def describe(ret, threshold):
+    if ret is None:
+        return "None"
+    mark = "hit" if ret["confidence"] >= threshold else "miss"
+    return f"{mark} {ret['confidence']:.3f} at {ret['result']}"
+
+
+def disagree(a, b, threshold):
+    hit_a = a is not None and a["confidence"] >= threshold
+    hit_b = b is not None and b["confidence"] >= threshold
+    if hit_a != hit_b:
+        return True
+    if not hit_a:
+        return False
+    (xa, ya), (xb, yb) = a["result"], b["result"]
+    return max(abs(xa - xb), abs(ya - yb)) > MAX_OFFSET
+
+
+def main(root, times=3):
+    files = [file for file in listdir(root) if cv2.imread(file) is not None]
+    if not files:
+        print(f"no image found in {root}")
+        return
+    templates = list(iter_templates(IMG))
+    costs = {method: 0 for method in SCREEN_METHODS}
+    hits = {method: 0 for method in SCREEN_METHODS}
+    disagreements = []
+    for file in files:
+        screen = cv2.imread(file)
+        preload_templates(IMG, (screen.shape[1], screen.shape[0]))
+        results = {}
+        for method in SCREEN_METHODS:
+            best = None
+            for _ in range(times):
+                results[method], cost = match_all(screen, templates, method)
+                best = cost if best is None else min(best, cost)
+            costs[method] += best
+            hits[method] += sum(
+                ret is not None and ret["confidence"] >= template.threshold
+                for template, ret in zip(templates, results[method])
+            )
+        for template, a, b in zip(templates, *(results[m] for m in SCREEN_METHODS)):
+            if disagree(a, b, template.threshold):
+                disagreements.append(
+                    (
+                        file,
+                        template,
+                        describe(a, template.threshold),
+                        describe(b, template.threshold),
+                    )
+                )
+
+    print(f"{len(files)} screenshots, {len(templates)} templates")
+    for method in SCREEN_METHODS:
+        print(
+            f"{method}: {costs[method] / len(files) * 1000:.2f} ms/screenshot, "
+            f"{hits[method]} hits"
+        )
+    print(f"disagreements: {len(disagreements)}")
+    for file, template, a, b in disagreements:
+        print(f"  {os.path.basename(file)} {template.filepath}")
+        for method, desc in zip(SCREEN_METHODS, (a, b)):
+            print(f"    {method}: {desc}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 3)
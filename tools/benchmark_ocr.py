@@ -0,0 +1,102 @@
+"""比较不同 OCR_PROFILE 设置下 OCR 模型的加载时间和识别耗时
+
+默认使用 autowsgr/data/images/ocr_test 中的截图, 每种设置单独启动一个进程测试, 避免线程数等全局设置互相影响.
+
+用法:
+    python tools/benchmark_ocr.py [easyocr|paddleocr] [截图目录] [次数]
+"""
+
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import cv2
+
+from autowsgr.constants.data_roots import DATA_ROOT, IMG_ROOT
+from autowsgr.timer.backends import EasyocrBackend, PaddleOCRBackend
+from autowsgr.utils.io import listdir, yaml_to_dict
+
+CPU_COUNT = os.cpu_count() or 1
+PROFILES = [
+    {"device": "auto", "threads": 0, "quantize": True, "angle_cls": False},
+    {"device": "cpu", "threads": 0, "quantize": False, "angle_cls": True},
+    {"device": "cpu", "threads": 0, "quantize": True, "angle_cls": False},
+    {"device": "cpu", "threads": 1, "quantize": True, "angle_cls": False},
+    {
+        "device": "cpu",
+        "threads": max(CPU_COUNT // 4, 1),
+        "quantize": True,
+        "angle_cls": False,
+    },
+]
+
+
+def run_profile(backend_name, root, times, profile):
+    """在当前进程中测试一种设置, 返回 (加载时间, 每张截图的平均识别时间)"""
+    config = yaml_to_dict(os.path.join(DATA_ROOT, "default_settings.yaml"))
+    config.update(
+        OCR_BACKEND=backend_name,
+        OCR_PROFILE=profile,
+        OCR_CACHE_SIZE=0,
+        OCR_CACHE_PATH="",
+        DIGIT_GLYPH_PATH="",
+        SHOW_OCR_INFO=False,
+    )
+    config = SimpleNamespace(**config)
+    logger = logging.getLogger("benchmark_ocr")
+    backend_class = {"easyocr": EasyocrBackend, "paddleocr": PaddleOCRBackend}
+    backend = backend_class[backend_name](config, logger)
+
+    images = [cv2.imread(file) for file in listdir(root)]
+    images = [image for image in images if image is not None]
+    start = time.perf_counter()
+    backend.reader  # 加载模型
+    load_time = time.perf_counter() - start
+    backend.read_text(images[0], None)  # 预热
+
+    start = time.perf_counter()
+    for _ in range(times):
+        for image in images:
+            backend.read_text(image, None)
+    cost = (time.perf_counter() - start) / times / len(images)
+    return load_time, cost
+
+
+def main(backend_name="paddleocr", root=None, times=3):
+    root = root or os.path.join(IMG_ROOT, "ocr_test")
+    print(f"backend: {backend_name}, images: {root}, cpu count: {CPU_COUNT}")
+    for profile in PROFILES:
+        result = subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                "--profile",
+                json.dumps(profile),
+                backend_name,
+                root,
+                str(times),
+            ],
+            capture_output=True,
+            text=True,
+        )
+        lines = result.stdout.strip().splitlines()
+        if result.returncode != 0 or not lines:
+            print(f"{profile}: failed\n{result.stderr[-500:]}")
+            continue
+        load_time, cost = json.loads(lines[-1])
+        print(f"{profile}: load {load_time:.2f}s, {cost * 1000:.1f} ms/image")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--profile":
+        profile = json.loads(sys.argv[2])
+        backend_name, root, times = sys.argv[3], sys.argv[4], int(sys.argv[5])
+        print(json.dumps(run_profile(backend_name, root, times, profile)))
+    else:
+        main(*sys.argv[1:3], *[int(x) for x in sys.argv[3:4]])
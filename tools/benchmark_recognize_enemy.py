@@ -0,0 +1,79 @@
+"""测试敌方舰种识别的单次耗时
+
+用 TemplateData 中的模板加噪声作为 6 个敌舰位置的输入, 统计 recognize_enemy 的耗时.
+在 Windows 上同时测试原来的 recognize_enemy.exe (写 args.in -> 启动进程 -> 读 res.out) 并比较结果.
+
+用法:
+    python tools/benchmark_recognize_enemy.py [次数]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import numpy as np
+
+from autowsgr.constants.data_roots import TUNNEL_ROOT
+from autowsgr.utils.enemy_recognize import TEMPLATE_DATA_PATH, recognize_enemy
+from autowsgr.utils.io import read_file
+from autowsgr.utils.math_functions import matrix_to_str
+
+
+def load_raw_templates():
+    with open(TEMPLATE_DATA_PATH) as f:
+        tokens = f.read().split()
+    images, pos = [], 1
+    for _ in range(int(tokens[0])):
+        n, m = int(tokens[pos + 1]), int(tokens[pos + 2])
+        images.append(
+            np.array(tokens[pos + 3 : pos + 3 + n * m], dtype=np.int32).reshape(n, m)
+        )
+        pos += 3 + n * m
+    return images
+
+
+def random_inputs(templates, rng):
+    images = []
+    for _ in range(6):
+        image = templates[rng.integers(len(templates))]
+        image = image + rng.normal(0, 20, image.shape)
+        images.append(np.clip(image, 0, 255).astype(np.uint8))
+    return images
+
+
+def run_exe(images):
+    with open(os.path.join(TUNNEL_ROOT, "args.in"), "w") as f:
+        f.write("recognize\n6\n" + "".join(matrix_to_str(image) for image in images))
+    subprocess.run([os.path.join(TUNNEL_ROOT, "recognize_enemy.exe"), TUNNEL_ROOT])
+    return read_file(os.path.join(TUNNEL_ROOT, "res.out")).split()
+
+
+def main(times=200):
+    rng = np.random.default_rng(0)
+    templates = load_raw_templates()
+    inputs = [random_inputs(templates, rng) for _ in range(times)]
+    recognize_enemy(inputs[0])  # 预先读取模板
+
+    start = time.perf_counter()
+    results = [recognize_enemy(images) for images in inputs]
+    cost = (time.perf_counter() - start) / times
+    print(
+        f"recognize_enemy: {cost * 1000:.2f} ms/call ({times} calls, 6 ships per call)"
+    )
+
+    if os.name != "nt":
+        return
+    count = min(times, 20)
+    start = time.perf_counter()
+    exe_results = [run_exe(images) for images in inputs[:count]]
+    cost = (time.perf_counter() - start) / count
+    print(f"recognize_enemy.exe: {cost * 1000:.2f} ms/call ({count} calls)")
+    same = sum(a == b for a, b in zip(results, exe_results))
+    print(f"same result: {same}/{count}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,60 @@
+"""根据参考截图生成界面像素签名表 (autowsgr/data/page_signatures.yaml)
+
+参考截图按界面名分目录存放, 目录名需与 ALL_PAGES 中的界面名一致, 例如:
+    screens/main_page/1.png
+    screens/map_page/1.png
+每个界面建议至少准备 3 张不同时间 (不同秘书舰, 不同资源数量等) 的截图, 可以用 timer.log_screen 截取.
+
+用法:
+    python tools/generate_page_signatures.py screens [output.yaml]
+"""
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import cv2
+
+from autowsgr.constants.data_roots import PAGE_SIGNATURE_PATH
+from autowsgr.constants.other_constants import ALL_PAGES
+from autowsgr.utils.io import listdir
+from autowsgr.utils.page_signature import (
+    PageSignatures,
+    generate_page_signatures,
+    save_page_signatures,
+)
+
+
+def load_screens(root):
+    screens = {}
+    for folder in listdir(root):
+        page = os.path.basename(folder)
+        if not os.path.isdir(folder):
+            continue
+        if page not in ALL_PAGES:
+            print(f"skip unknown page: {page}")
+            continue
+        images = [cv2.imread(file) for file in listdir(folder)]
+        screens[page] = [image for image in images if image is not None]
+    return screens
+
+
+if __name__ == "__main__":
+    root = sys.argv[1]
+    output = sys.argv[2] if len(sys.argv) > 2 else PAGE_SIGNATURE_PATH
+    screens = load_screens(root)
+    table = generate_page_signatures(screens)
+    save_page_signatures(table, output)
+    print(f"saved {len(table)} pages to {output}")
+
+    # 用参考截图检查签名表
+    signatures = PageSignatures(table)
+    for page, images in screens.items():
+        for image in images:
+            start = time.perf_counter()
+            result = signatures.classify(image)
+            cost = (time.perf_counter() - start) * 1000
+            status = "ok" if result == [page] else "AMBIGUOUS/MISS"
+            print(f"{page:<28} {status:<15} {cost:.2f}ms {result}")